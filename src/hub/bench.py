@@ -0,0 +1,476 @@
+'''
+File: bench.py
+Description: Benchmarks for hub
+Run with: hub bench [--plugins N] [--notes M] [--note-size BYTES] [--catalog K] [--runs R] [--json FILE]
+     or: python -m hub.bench [same options]
+     or: python -m hub.bench --startup [--plugins N] [--runs R]
+     or: python -m hub.bench --imports [--budget MS]
+'''
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PLUGIN_TEMPLATE = """\
+'''Synthetic benchmark plugin {index}.'''
+VMAJOR = 0
+VMINOR = 1
+VPATCH = 0
+ID = "bench.synthetic.plugin{index}"
+
+
+def meta_data():
+    return {{
+        "name": "bench{index}",
+        "description": "Synthetic plugin {index} generated by hub.bench.",
+        "file_path": __file__,
+    }}
+
+
+def main(api, args):
+    return "bench{index}"
+{functions}
+
+def hub_add_api():
+    return {{
+        "main": main,
+    }}
+"""
+
+FUNCTION_TEMPLATE = """
+
+def command_{index}(api, args):
+    values = [len(arg) * {index} for arg in args]
+    if not values:
+        return "command_{index}: no arguments"
+    total = sum(values)
+    return [f"command_{index}: {{value}} of {{total}}" for value in values]
+"""
+
+
+def make_plugins(plugins_dir, count, functions=40):
+    '''
+    Write synthetic plugins into a plugins directory
+
+    Args:
+        plugins_dir: Directory to write the plugins to
+        count: Number of plugins to generate
+        functions: Number of command functions per plugin
+    '''
+    os.makedirs(plugins_dir, exist_ok=True)
+    body = "".join(FUNCTION_TEMPLATE.format(index=index) for index in range(functions))
+    for index in range(count):
+        with open(os.path.join(plugins_dir, f"bench{index}.py"), "w", encoding="UTF-8") as file:
+            file.write(PLUGIN_TEMPLATE.format(index=index, functions=body))
+
+
+def make_env(root):
+    '''
+    Build an environment that points hub at a throwaway config, data and cache directory
+
+    Args:
+        root: Root of the throwaway directory tree
+
+    Returns:
+        Environment dictionary for subprocesses
+    '''
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    env["XDG_CONFIG_HOME"] = os.path.join(root, "config")
+    env["XDG_DATA_HOME"] = os.path.join(root, "data")
+    env["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+    # The benchmark measures hub's bytecode cache, which honours this setting
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def time_invocation(env, argv, prepare=None, cwd=None):
+    '''
+    Time one `python -m hub.main` invocation
+
+    Args:
+        env: Environment for the subprocess
+        argv: Arguments passed to hub
+        prepare: Optional callable run before starting the clock
+        cwd: Optional working directory for the subprocess
+
+    Returns:
+        Wall time in seconds
+    '''
+    if prepare:
+        prepare()
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "hub.main", *argv],
+        env=env,
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def run_startup(plugins, runs, functions=40):
+    '''
+    Compare cold and warm hub startup with a number of synthetic plugins installed
+
+    Args:
+        plugins: Number of synthetic plugins
+        runs: Number of timed runs per scenario
+        functions: Number of command functions per plugin
+
+    Returns:
+        Dictionary mapping scenario name to a list of wall times in seconds
+    '''
+    root = tempfile.mkdtemp(prefix="hub-bench-")
+    try:
+        env = make_env(root)
+        config_dir = os.path.join(env["XDG_CONFIG_HOME"], "hub")
+        cache_dir = os.path.join(env["XDG_CACHE_HOME"], "hub")
+        make_plugins(os.path.join(config_dir, "plugins"), plugins, functions)
+        manifest = os.path.join(config_dir, "manifest.json")
+        bytecode = os.path.join(cache_dir, "bytecode")
+
+        def drop_manifest():
+            if os.path.exists(manifest):
+                os.remove(manifest)
+
+        def drop_all():
+            drop_manifest()
+            shutil.rmtree(bytecode, ignore_errors=True)
+
+        scenarios = {
+            # No index and no bytecode: every plugin is compiled and imported
+            "cold": drop_all,
+            # No index, bytecode cached: every plugin is imported without compiling
+            "reindex": drop_manifest,
+            # Index and bytecode cached: only the target plugin is imported
+            "warm": None,
+        }
+        results = {}
+        for name, prepare in scenarios.items():
+            time_invocation(env, ["bench0"], prepare)
+            results[name] = [time_invocation(env, ["bench0"], prepare) for _ in range(runs)]
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+WORDS = (
+    "sync", "note", "todo", "calendar", "git", "markdown", "export", "import", "backup", "crypto",
+    "weather", "timer", "clock", "music", "video", "search", "index", "cloud", "mail", "chat",
+)
+
+# Times main() in one process, so dispatch is measured without interpreter startup
+IN_PROCESS_SCRIPT = """
+import contextlib, io, json, sys, time
+from hub import main
+times = []
+for _ in range(int(sys.argv[1])):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        main.main(sys.argv[2:])
+        times.append(time.perf_counter() - start)
+print(json.dumps(times))
+"""
+
+
+def make_notes(data_dir, count, size):
+    '''
+    Write synthetic notes into a data directory
+
+    Args:
+        data_dir: Directory to write the notes to
+        count: Number of notes, named note0, note1, ...
+        size: Approximate size of each note in bytes
+    '''
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(0)
+    for index in range(count):
+        words = []
+        length = 0
+        while length < size:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        with open(os.path.join(data_dir, f"note{index}"), "w", encoding="UTF-8") as file:
+            file.write(" ".join(words))
+
+
+def make_catalog(repo_dir, count):
+    '''
+    Write a synthetic plugin repository
+
+    Args:
+        repo_dir: The repo plugin's config directory
+        count: Number of plugins in the repository
+    '''
+    os.makedirs(repo_dir, exist_ok=True)
+    rng = random.Random(0)
+    plugins = []
+    for index in range(count):
+        name = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}{index}"
+        plugins.append({
+            "name": name,
+            "description": " ".join(rng.choices(WORDS, k=8)),
+            "url": f"http://127.0.0.1:9/{name}.py",
+        })
+    repo = {
+        "repo-info": {"name": "bench", "description": "Synthetic catalog generated by hub.bench.", "url": ""},
+        "plugins": plugins,
+    }
+    with open(os.path.join(repo_dir, "bench.json"), "w", encoding="UTF-8") as file:
+        json.dump(repo, file)
+
+
+def summarize(times):
+    '''
+    Summarize timings
+
+    Args:
+        times: Wall times in seconds
+
+    Returns:
+        Dictionary with the sorted runs, min, mean, p50, p90, p99 and max in milliseconds
+    '''
+    ordered = sorted(seconds * 1000 for seconds in times)
+
+    def percentile(p):
+        # Nearest-rank percentile
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "runs_ms": [round(value, 3) for value in ordered],
+        "min_ms": round(ordered[0], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(percentile(50), 3),
+        "p90_ms": round(percentile(90), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def run_suite(plugins, notes, note_size, catalog, runs, functions=40):
+    '''
+    Time hub commands against a throwaway config and data directory holding synthetic
+    plugins, notes and a plugin catalog
+
+    Args:
+        plugins: Number of synthetic plugins
+        notes: Number of notes
+        note_size: Approximate size of each note in bytes
+        catalog: Number of plugins in the synthetic repository
+        runs: Number of timed runs per scenario
+        functions: Number of command functions per plugin
+
+    Returns:
+        Dictionary mapping scenario name to summarize() output
+    '''
+    root = tempfile.mkdtemp(prefix="hub-bench-")
+    try:
+        env = make_env(root)
+        env["HUB_NO_DAEMON"] = "1"
+        config_dir = os.path.join(env["XDG_CONFIG_HOME"], "hub")
+        cache_dir = os.path.join(env["XDG_CACHE_HOME"], "hub")
+        make_plugins(os.path.join(config_dir, "plugins"), plugins, functions)
+        make_notes(os.path.join(env["XDG_DATA_HOME"], "hub"), notes, note_size)
+        make_catalog(os.path.join(config_dir, "repo"), catalog)
+
+        def drop_index():
+            manifest = os.path.join(config_dir, "manifest.json")
+            if os.path.exists(manifest):
+                os.remove(manifest)
+            shutil.rmtree(os.path.join(cache_dir, "bytecode"), ignore_errors=True)
+
+        def drop_pkg():
+            shutil.rmtree(os.path.join(config_dir, "pkg"), ignore_errors=True)
+
+        new_names = (f"bench-new-{index}" for index in itertools.count())
+        scenarios = [
+            ("dispatch cold", lambda: ["bench0"], drop_index),
+            ("dispatch warm", lambda: ["bench0"], None),
+            ("info:catalog", lambda: ["info:catalog"], None),
+            ("notes:list", lambda: ["mem:list"], None),
+            ("notes:recall", lambda: ["mem:recall", "note0"], None),
+            ("notes:new", lambda: ["mem:new", next(new_names), "benchmark", "note"], None),
+            ("notes:edit", lambda: ["mem:edit", "note1", "edited", "by", "hub.bench"], None),
+            ("repo:build cold", lambda: ["repo:build"], drop_pkg),
+            ("repo:build warm", lambda: ["repo:build"], None),
+            ("repo:search", lambda: ["repo:search", "sync"], None),
+        ]
+        results = {}
+        for name, argv, prepare in scenarios:
+            time_invocation(env, argv(), prepare, cwd=root)
+            results[name] = summarize([time_invocation(env, argv(), prepare, cwd=root) for _ in range(runs)])
+
+        output = subprocess.run(
+            [sys.executable, "-c", IN_PROCESS_SCRIPT, str(runs), "bench0"],
+            env=env,
+            cwd=root,
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+        results["dispatch in-process"] = summarize(json.loads(output.splitlines()[-1]))
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# Modules that one-shot commands must never import
+INTERACTIVE_MODULES = ("prompt_toolkit", "embed_term")
+
+
+def measure_imports(argv):
+    '''
+    Measure what a one-shot hub invocation imports, using `python -X importtime`
+
+    Args:
+        argv: Arguments passed to hub
+
+    Returns:
+        Tuple of (total import time in seconds, list of imported module names),
+        counting only imports made from the hub package onwards
+    '''
+    root = tempfile.mkdtemp(prefix="hub-bench-")
+    try:
+        env = make_env(root)
+        # Populate the plugin index first so the measured run is a warm one
+        subprocess.run([sys.executable, "-m", "hub.main", *argv], env=env, check=True, stdout=subprocess.DEVNULL)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "hub.main", *argv],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    total = 0
+    modules = []
+    counting = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        top_level = not name.startswith("  ", 1)
+        name = name.strip()
+        if top_level and (name == "hub" or name.startswith("hub.")):
+            counting = True
+        if not counting:
+            continue
+        modules.append(name)
+        if top_level:
+            total += int(cumulative)
+    return total / 1_000_000, modules
+
+
+def check_import_budget(budget, argv=("hi",)):
+    '''
+    Check that a one-shot invocation stays under an import-time budget and does not
+    import the interactive terminal stack
+
+    Args:
+        budget: Import-time budget in seconds
+        argv: Arguments passed to hub
+
+    Returns:
+        List of problems found; empty when the check passes
+    '''
+    total, modules = measure_imports(list(argv))
+    problems = [
+        f"one-shot mode imported {name}"
+        for name in modules
+        if name.split(".")[0] in INTERACTIVE_MODULES
+    ]
+    if total > budget:
+        problems.append(f"one-shot imports took {total * 1000:.1f} ms, budget is {budget * 1000:.1f} ms")
+    return problems
+
+
+def main(args=None):
+    '''
+    Run the benchmarks and print a summary
+
+    Args:
+        args: Command line arguments
+    '''
+    parser = argparse.ArgumentParser(prog="hub bench", description="Benchmark hub.")
+    parser.add_argument("--plugins", type=int, default=50, help="number of synthetic plugins")
+    parser.add_argument("--functions", type=int, default=40, help="command functions per plugin")
+    parser.add_argument("--notes", type=int, default=1000, help="number of synthetic notes")
+    parser.add_argument("--note-size", type=int, default=512, help="approximate note size in bytes")
+    parser.add_argument("--catalog", type=int, default=5000, help="plugins in the synthetic repository")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per scenario")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE as JSON")
+    parser.add_argument("--startup", action="store_true", help="only compare cold and warm startup")
+    parser.add_argument("--imports", action="store_true", help="check one-shot import time instead")
+    parser.add_argument("--budget", type=float, default=25.0, help="one-shot import budget in ms")
+    options = parser.parse_args(args)
+
+    if options.imports:
+        problems = check_import_budget(options.budget / 1000)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print(f"one-shot imports are within the {options.budget:.1f} ms budget")
+        return
+
+    if options.startup:
+        results = run_startup(options.plugins, options.runs, options.functions)
+        print(f"hub startup with {options.plugins} plugins, {options.runs} runs each")
+        for name, times in results.items():
+            print(
+                f"  {name:<8} median {statistics.median(times) * 1000:8.1f} ms"
+                f"   min {min(times) * 1000:8.1f} ms"
+            )
+        return
+
+    results = run_suite(options.plugins, options.notes, options.note_size, options.catalog, options.runs, options.functions)
+    print(
+        f"hub with {options.plugins} plugins, {options.notes} notes of ~{options.note_size} bytes and "
+        f"a {options.catalog}-plugin catalog, {options.runs} runs each"
+    )
+    print(f"  {'scenario':<20} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'min ms':>9}")
+    for name, summary in results.items():
+        print(
+            f"  {name:<20} {summary['p50_ms']:>9.1f} {summary['p90_ms']:>9.1f}"
+            f" {summary['p99_ms']:>9.1f} {summary['min_ms']:>9.1f}"
+        )
+    if options.json:
+        from hub import main as hub_main  # pylint: disable=import-outside-toplevel
+        report = {
+            "hub_version": f"{hub_main.VMAJOR}.{hub_main.VMINOR}.{hub_main.VPATCH}",
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "parameters": {
+                "plugins": options.plugins,
+                "functions": options.functions,
+                "notes": options.notes,
+                "note_size": options.note_size,
+                "catalog": options.catalog,
+                "runs": options.runs,
+            },
+            "results": results,
+        }
+        with open(options.json, "w", encoding="UTF-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {options.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+'''
+File: daemon.py
+Description: Optional hub daemon serving commands over a local Unix socket, and the thin
+client used by main() to forward one-shot commands to it
+
+Protocol: the daemon greets each connection with {"ready": true}; a client not greeted
+within READY_TIMEOUT (the daemon is busy with another command, perhaps one reading this
+client's output through a pipe) closes the connection without a request and runs the
+command itself. Otherwise it sends one JSON line {"argv": [...], "cwd": "...", "env": {...}} (or
+{"stop": true}), "env" holding the variables hub reads (ENVIRONMENT_KEYS). The daemon
+answers with JSON lines {"out": text} / {"err": text} as output is produced ({"outb":
+base64} / {"errb": base64} for bytes written to sys.stdout.buffer), followed by a final {"exit": code}, or with {"local": true} when its own values of those variables differ
+and the client must run the command itself.
+
+The command's stdin is the client's: each time the command reads, the daemon sends
+{"read": size} and the client answers {"data": base64} with up to size bytes of its stdin,
+empty at end of file. Commands that never read stdin cost no extra round trips.
+'''
+import base64
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+
+BUFFER_SIZE = 4096
+# Seconds a client waits for a busy daemon before running its command itself
+READY_TIMEOUT = 0.25
+# Environment variables hub reads; a daemon whose own values differ from the client's does
+# not run its commands
+ENVIRONMENT_KEYS = (
+    "XDG_CONFIG_HOME", "XDG_DATA_HOME", "XDG_CACHE_HOME", "HOME", "APPDATA", "LOCALAPPDATA",
+    "HUB_OFFLINE", "HUB_DOWNLOAD_CACHE_MB",
+    "HTTP_PROXY", "HTTPS_PROXY", "NO_PROXY", "http_proxy", "https_proxy", "no_proxy",
+    "REQUESTS_CA_BUNDLE", "CURL_CA_BUNDLE", "SSL_CERT_FILE", "SSL_CERT_DIR",
+)
+
+
+class _SocketWriter(io.TextIOBase):
+    '''
+    Text stream that forwards everything written to it to the client as JSON frames
+    '''
+
+    def __init__(self, conn, key):
+        super().__init__()
+        self._conn = conn
+        self._key = key
+        self._buffer = []
+        self._size = 0
+        # Binary output, e.g. a tar export written to sys.stdout.buffer
+        self.buffer = io.BufferedWriter(_SocketBinaryWriter(self))
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= BUFFER_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        self.buffer.flush()
+        self.flush_text()
+
+    def flush_text(self):
+        if self._buffer:
+            _send(self._conn, {self._key: "".join(self._buffer)})
+            self._buffer = []
+            self._size = 0
+
+    def send_bytes(self, data):
+        # Keep text written earlier ahead of these bytes
+        self.flush_text()
+        _send(self._conn, {self._key + "b": base64.b64encode(data).decode("ascii")})
+
+
+class _SocketBinaryWriter(io.RawIOBase):
+    '''
+    Binary stream behind a _SocketWriter, forwarding bytes to the client as base64 frames
+    '''
+
+    def __init__(self, text):
+        super().__init__()
+        self._text = text
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._text.send_bytes(bytes(data))
+        return len(data)
+
+
+class _SocketReader(io.RawIOBase):
+    '''
+    Binary stream reading the client's stdin, a {"read": size} request at a time
+    '''
+
+    def __init__(self, conn, stream, writers):
+        super().__init__()
+        self._conn = conn
+        self._stream = stream
+        self._writers = writers
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._eof:
+            return 0
+        # Let the client show any prompt before it blocks on its stdin
+        for writer in self._writers:
+            writer.flush()
+        _send(self._conn, {"read": len(buffer)})
+        line = self._stream.readline()
+        if not line:
+            raise OSError("The client disconnected.")
+        data = base64.b64decode(json.loads(line)["data"])
+        if not data:
+            self._eof = True
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode("UTF-8") + b"\n")
+
+
+def relevant_environment(environ=None):
+    '''
+    Select the environment variables a forwarded command must agree on
+
+    Args:
+        environ: Environment to read, os.environ by default
+
+    Returns:
+        Dictionary of the relevant variables that are set
+    '''
+    environ = os.environ if environ is None else environ
+    return {key: environ[key] for key in ENVIRONMENT_KEYS if key in environ}
+
+
+def _connect(socket_path):
+    '''
+    Connect to the daemon socket
+
+    Args:
+        socket_path: Path to the daemon socket
+
+    Returns:
+        A connected socket, or None if no daemon is listening
+    '''
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def forward(socket_path, args):
+    '''
+    Forward a command to the running daemon and stream its output
+
+    Args:
+        socket_path: Path to the daemon socket
+        args: The command followed by its arguments
+
+    Returns:
+        The command's exit code, or None if the command should run in-process instead:
+        no daemon answered, or the daemon's environment differs
+    '''
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+
+    with sock, sock.makefile("rb") as stream:
+        sock.settimeout(READY_TIMEOUT)
+        try:
+            if not stream.readline():
+                return None
+            sock.settimeout(None)
+            _send(sock, {"argv": list(args), "cwd": os.getcwd(), "env": relevant_environment()})
+        except OSError:
+            # Includes the timeout of a busy daemon, which never sees a request
+            return None
+        for line in stream:
+            message = json.loads(line)
+            if message.get("local"):
+                return None
+            if "out" in message:
+                print(message["out"], end="", flush=True)
+            elif "err" in message:
+                print(message["err"], end="", file=sys.stderr, flush=True)
+            elif "outb" in message:
+                _write_bytes(sys.stdout, base64.b64decode(message["outb"]))
+            elif "errb" in message:
+                _write_bytes(sys.stderr, base64.b64decode(message["errb"]))
+            elif "read" in message:
+                _send(sock, {"data": base64.b64encode(_read_stdin(message["read"])).decode("ascii")})
+            elif "exit" in message:
+                return message["exit"]
+    # The daemon went away mid-command; the output so far has been printed
+    return 1
+
+
+def _write_bytes(stream, data):
+    stream.flush()
+    stream.buffer.write(data)
+    stream.buffer.flush()
+
+
+def _read_stdin(size):
+    '''
+    Read up to size bytes of this process's stdin, returning what is available rather
+    than waiting for all of it
+
+    Args:
+        size: Maximum number of bytes
+
+    Returns:
+        The bytes read, empty at end of file
+    '''
+    if sys.stdin is None:
+        return b""
+    buffer = getattr(sys.stdin, "buffer", None)
+    if buffer is None:
+        return sys.stdin.read(size).encode("UTF-8")
+    if hasattr(buffer, "read1"):
+        return buffer.read1(size)
+    return buffer.read(size)
+
+
+def stop(socket_path):
+    '''
+    Ask a running daemon to shut down
+
+    Args:
+        socket_path: Path to the daemon socket
+
+    Returns:
+        True if a daemon was running, False otherwise
+    '''
+    sock = _connect(socket_path)
+    if sock is None:
+        return False
+    with sock, sock.makefile("rb") as stream:
+        _send(sock, {"stop": True})
+        # Wait for the daemon to take the request, after any command it is running
+        for line in stream:
+            if "exit" in json.loads(line):
+                break
+    return True
+
+
+def serve(socket_path, run_command):
+    '''
+    Serve commands on a Unix socket until interrupted or stopped
+
+    Args:
+        socket_path: Path to the daemon socket
+        run_command: Callable running one command, given its argv list, and returning
+            False if it failed
+    '''
+    if not hasattr(socket, "AF_UNIX"):
+        print("The hub daemon needs Unix socket support, which this platform lacks.")
+        return
+    if os.path.exists(socket_path):
+        if _connect(socket_path) is not None:
+            print(f"A hub daemon is already listening on {socket_path}.")
+            return
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    print(f"hub daemon listening on {socket_path}")
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                if not _handle(conn, run_command):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    print("hub daemon stopped.")
+
+
+@contextlib.contextmanager
+def _redirect_stdin(stream):
+    # Commands read the client's stdin, never the daemon's own, which may be a terminal
+    old_stdin = sys.stdin
+    sys.stdin = stream
+    try:
+        yield
+    finally:
+        sys.stdin = old_stdin
+
+
+def _handle(conn, run_command):
+    '''
+    Run one client request
+
+    Args:
+        conn: The client connection
+        run_command: Callable running one command, given its argv list
+
+    Returns:
+        False if the daemon was asked to stop, True otherwise
+    '''
+    with conn.makefile("rb") as stream:
+        return _handle_request(conn, stream, run_command)
+
+
+def _handle_request(conn, stream, run_command):
+    '''
+    Run one client request, given a stream reading the connection
+
+    Returns:
+        False if the daemon was asked to stop, True otherwise
+    '''
+    try:
+        _send(conn, {"ready": True})
+        request = json.loads(stream.readline())
+    except (OSError, ValueError):
+        # The client gave up waiting, or sent no valid request
+        return True
+
+    if request.get("stop"):
+        _send(conn, {"exit": 0})
+        return False
+    if request.get("env", {}) != relevant_environment():
+        _send(conn, {"local": True})
+        return True
+
+    out = _SocketWriter(conn, "out")
+    err = _SocketWriter(conn, "err")
+    exit_code = 0
+    cwd = os.getcwd()
+    try:
+        try:
+            os.chdir(request.get("cwd", cwd))
+        except OSError as e:
+            _send(conn, {"err": f"Cannot use working directory: {e}\n"})
+            _send(conn, {"exit": 1})
+            return True
+        stdin = io.TextIOWrapper(io.BufferedReader(_SocketReader(conn, stream, (out, err))), encoding="UTF-8")
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err), _redirect_stdin(stdin):
+            try:
+                if run_command(request["argv"]) is False:
+                    exit_code = 1
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                exit_code = 1
+        out.flush()
+        err.flush()
+        _send(conn, {"exit": exit_code})
+    except OSError:
+        # The client disconnected; keep serving others
+        pass
+    finally:
+        os.chdir(cwd)
+    return True
@@ -0,0 +1,274 @@
+'''
+File: fetch.py
+Description: Content-addressed download cache shared by plugins through api["download"]
+
+Every download is stored once under <cache>/downloads/objects, named by its sha256, and
+the last answer seen for each URL (its hash, ETag and Last-Modified) under
+<cache>/downloads/urls. A download whose expected hash is already cached costs no request
+at all; any other cached URL is revalidated with a conditional request, and fails rather
+than passing off the cached copy as current if the server cannot be reached. Interrupted
+downloads are resumed with Range requests. The least recently used objects are evicted
+once the cache grows past HUB_DOWNLOAD_CACHE_MB (256 by default). With HUB_OFFLINE set,
+downloads are served from the cache only. Downloads of one URL are serialized with a lock
+file, between threads and between hub processes sharing the cache, as they share its
+partial file.
+'''
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, concurrent downloads of one URL may fail
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 30
+DEFAULT_MAX_SIZE_MB = 256
+
+
+class DownloadError(OSError):
+    '''
+    A download failed, or is not cached while offline
+    '''
+
+
+def is_offline():
+    '''
+    Check whether hub was told not to use the network (HUB_OFFLINE)
+
+    Returns:
+        True if downloads must be served from the cache
+    '''
+    return os.environ.get("HUB_OFFLINE", "") not in ("", "0")
+
+
+class DownloadCache:
+    '''
+    Download cache rooted in a cache directory
+    '''
+
+    def __init__(self, cache_dir, max_size=None):
+        self.root = os.path.join(cache_dir, "downloads")
+        if max_size is None:
+            try:
+                max_size = int(os.environ.get("HUB_DOWNLOAD_CACHE_MB", DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+            except ValueError:
+                max_size = DEFAULT_MAX_SIZE_MB * 1024 * 1024
+        self.max_size = max_size
+        for name in ("objects", "urls", "partial"):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+    def object_path(self, digest):
+        '''
+        Path of the cached object with a sha256 hex digest
+        '''
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def lookup(self, url):
+        '''
+        Find the last cached answer for a URL
+
+        Args:
+            url: The URL
+
+        Returns:
+            Dictionary with its "sha256", "etag" and "last_modified", or None if the URL
+            or its object is not cached
+        '''
+        try:
+            with open(self._url_path(url), "r", encoding="UTF-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or not os.path.exists(self.object_path(entry.get("sha256", ""))):
+            return None
+        return entry
+
+    def fetch(self, url, sha256=None, session=None):
+        '''
+        Get the content of a URL through the cache
+
+        Args:
+            url: The URL to download
+            sha256: Expected sha256 hex digest of the content, if known. A cached object
+                with this hash is returned without any request, and a download with a
+                different hash is rejected.
+            session: Optional requests session to download with
+
+        Returns:
+            Tuple of (path of the cached object, its sha256 hex digest). The object is
+            shared: copy it rather than moving or modifying it.
+
+        Raises:
+            DownloadError: The download failed or did not match sha256, or the content is
+                not cached while offline
+        '''
+        sha256 = sha256.lower() if sha256 else None
+        if sha256 and os.path.exists(self.object_path(sha256)):
+            return self._use(sha256), sha256
+
+        entry = self.lookup(url)
+        if entry and sha256 and entry["sha256"] != sha256:
+            entry = None
+        if is_offline():
+            if entry is None:
+                raise DownloadError(f"{url} is not in the download cache and hub is offline.")
+            return self._use(entry["sha256"]), entry["sha256"]
+        with self._lock(url):
+            # Another thread or process may have downloaded it while we waited
+            if sha256 and os.path.exists(self.object_path(sha256)):
+                return self._use(sha256), sha256
+            entry = self.lookup(url)
+            if entry and sha256 and entry["sha256"] != sha256:
+                entry = None
+            return self._download(url, sha256, entry, session)
+
+    def evict(self, keep=None):
+        '''
+        Remove the least recently used objects until the cache fits its size limit
+
+        Args:
+            keep: Optional digest of an object that must not be removed
+        '''
+        objects = []
+        total = 0
+        for directory, _, filenames in os.walk(os.path.join(self.root, "objects")):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                objects.append((stat.st_mtime_ns, stat.st_size, filename, path))
+                total += stat.st_size
+        for _, size, filename, path in sorted(objects):
+            if total <= self.max_size:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def _download(self, url, sha256, entry, session):
+        if session is None:
+            import requests  # pylint: disable=import-outside-toplevel
+            session = requests
+        from requests import RequestException  # pylint: disable=import-outside-toplevel
+
+        key = self._url_key(url)
+        part_path = os.path.join(self.root, "partial", key + ".part")
+        validator = self._read_partial(part_path, url)
+        offset = os.path.getsize(part_path) if validator and os.path.exists(part_path) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        elif entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+        except RequestException as e:
+            # Not served from the cache: callers would report a stale copy as current.
+            # HUB_OFFLINE asks for the cached copy explicitly.
+            if entry and not offset:
+                raise DownloadError(f"Failed to download {url}: {e}. Set HUB_OFFLINE=1 to use the cached copy.") from e
+            raise DownloadError(f"Failed to download {url}: {e}") from e
+        with response:
+            if response.status_code == 304 and entry and not offset:
+                return self._use(entry["sha256"]), entry["sha256"]
+            if response.status_code == 416 and offset:
+                # The partial file is already complete, or no longer matches the remote file
+                response.close()
+                os.remove(part_path)
+                return self._download(url, sha256, entry, session)
+            resumed = response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+            if response.status_code != 200 and not resumed:
+                raise DownloadError(f"Failed to download {url}: HTTP {response.status_code}.")
+
+            digest = hashlib.sha256()
+            if resumed:
+                with open(part_path, "rb") as file:
+                    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            validator = etag or last_modified
+            with open(part_path + ".json", "w", encoding="UTF-8") as file:
+                json.dump({"url": url, "validator": validator}, file)
+            try:
+                with open(part_path, "ab" if resumed else "wb") as file:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        file.write(chunk)
+                        digest.update(chunk)
+                    file.flush()
+                    os.fsync(file.fileno())
+            except RequestException as e:
+                if validator:
+                    raise DownloadError(f"Download of {url} was interrupted ({e}); try again to resume.") from e
+                raise DownloadError(f"Download of {url} was interrupted ({e}).") from e
+
+        os.remove(part_path + ".json")
+        digest = digest.hexdigest()
+        if sha256 and digest != sha256:
+            os.remove(part_path)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}.")
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(part_path, object_path)
+        self._write_entry(url, {"url": url, "sha256": digest, "etag": etag, "last_modified": last_modified})
+        self.evict(keep=digest)
+        return object_path, digest
+
+    @contextlib.contextmanager
+    def _lock(self, url):
+        if fcntl is None:
+            yield
+            return
+        # flock() locks belong to the open file, so they also exclude other threads
+        with open(os.path.join(self.root, "partial", self._url_key(url) + ".lock"), "a") as file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _use(self, digest):
+        # Object mtimes order the LRU eviction
+        path = self.object_path(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def _write_entry(self, url, entry):
+        path = self._url_path(url)
+        temp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with open(temp_path, "w", encoding="UTF-8") as file:
+            json.dump(entry, file)
+        os.replace(temp_path, path)
+
+    def _read_partial(self, part_path, url):
+        try:
+            with open(part_path + ".json", "r", encoding="UTF-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return state.get("validator") if state.get("url") == url else None
+
+    def _url_path(self, url):
+        return os.path.join(self.root, "urls", self._url_key(url) + ".json")
+
+    @staticmethod
+    def _url_key(url):
+        return hashlib.sha256(url.encode("UTF-8")).hexdigest()
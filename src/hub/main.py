@@ -1,7 +1,7 @@
 '''
 File: main.py
 Description: Plugin manager and entry point for mem-note
-Updated to use prompt_toolkit-based embed_term
+Interactive mode uses prompt_toolkit, imported only when it is needed
 '''
 import os
 import sys
@@ -9,14 +9,40 @@ import importlib.util
 import shutil
 import random
 import json
-from prompt_toolkit.shortcuts import prompt
-from embed_term.term import EmbedTerminal  # pylint: disable=import-error
+import time
+import types
+import marshal
+import codecs
+import contextlib
+import keyword
+import operator
+from collections.abc import Iterator, Mapping
 
 DEBUG = False
 VMAJOR = 0
 VMINOR = 4
 VPATCH = 0
+MANIFEST_FORMAT = 3
+STREAM_CHUNK_SIZE = 64 * 1024
 API = {}
+# Session-scoped caches: plugin path -> (mtime_ns, size, module), and the parsed manifest
+_MODULES = {}
+_MANIFEST_CACHE = {}
+# Memoized directory resolution, see clear_dir_cache()
+_DIR_CACHE = {}
+# hub.profiling.Profiler when running with --profile / HUB_PROFILE, see _phase()
+_PROFILER = None
+# (pid, event loop) running async plugin commands in a background thread, see _get_event_loop()
+_EVENT_LOOP = None
+# Arithmetic _literal() evaluates in plugin sources, by ast operator class name
+_ARITHMETIC = {
+    "Add": operator.add,
+    "Sub": operator.sub,
+    "Mult": operator.mul,
+    "Div": operator.truediv,
+    "FloorDiv": operator.floordiv,
+    "Mod": operator.mod,
+}
 
 
 def main(args=None):  # pylint: disable=dangerous-default-value
@@ -24,15 +50,25 @@ def main(args=None):  # pylint: disable=dangerous-default-value
     Main entry point for hub application
     1. Parse command line arguments
     2. If no args, launch embedded terminal
-    3. Handle core commands: init, load, reset
-    4. Otherwise treat first arg as plugin name to load and run
+    3. Handle core commands: init, load, reset, reload, serve, run, bench
+    4. Otherwise treat first arg as plugin name to load and run,
+       forwarding it to a running hub daemon when there is one
     5. Loop back to embedded terminal if needed
     '''
+    global _PROFILER  # pylint: disable=global-statement
     if args is None:
         args = sys.argv[1:]
     
+    if any(arg.startswith(("--profile", "--cprofile")) for arg in args[:2]) or (
+        os.environ.get("HUB_PROFILE") or os.environ.get("HUB_CPROFILE")
+    ):
+        from hub import profiling  # pylint: disable=import-outside-toplevel
+        _PROFILER, args = profiling.parse_options(args)
+    
     if not args:
-        # Interactive embedded terminal mode
+        # Interactive embedded terminal mode; prompt_toolkit is only imported here and in
+        # reset() so one-shot commands do not pay for it
+        from prompt_toolkit.shortcuts import prompt  # pylint: disable=import-outside-toplevel
         print("Welcome to hub. Type 'exit' to quit.")
         try:
             while True:
@@ -44,27 +80,10 @@ def main(args=None):  # pylint: disable=dangerous-default-value
                         continue
                     
                     args = cmd.split()
-                    command = args[0]
-                    
-                    # Handle core commands
-                    commands = {
-                        "init": init,
-                        "load": load,
-                        "reset": reset,
-                    }
-                    
-                    if command in commands:
-                        commands[command](args[1:])
-                    elif command.lower() == "exit":
+                    if args[0].lower() == "exit":
                         print("Exiting hub.")
                         sys.exit(0)
-                    else:
-                        # Treat command as a plugin name
-                        split_command = command.split(":")
-                        if len(split_command) < 2:
-                            run_plugin(command, "main", args[1:])
-                        else:
-                            run_plugin(split_command[0], split_command[1], args[1:])
+                    _run_profiled(args)
                 
                 except KeyboardInterrupt:
                     print("\nInterrupted.")
@@ -76,24 +95,112 @@ def main(args=None):  # pylint: disable=dangerous-default-value
     else:
         # Command line mode: execute single command and exit
         command = args[0]
+        if command.lower() == "exit":
+            sys.exit(0)
         
-        commands = {
-            "init": init,
-            "load": load,
-            "reset": reset,
-        }
+        # A profiled command runs in-process, where its phases can be measured
+        if command not in get_core_commands() and not os.environ.get("HUB_NO_DAEMON") and _PROFILER is None:
+            socket_path = get_daemon_socket()
+            if os.path.exists(socket_path):
+                from hub import daemon  # pylint: disable=import-outside-toplevel
+                exit_code = daemon.forward(socket_path, args)
+                if exit_code is not None:
+                    if exit_code:
+                        sys.exit(exit_code)
+                    return
         
-        if command in commands:
-            commands[command](args[1:])
-        elif command.lower() == "exit":
-            sys.exit(0)
-        else:
-            # Treat command as a plugin name
-            split_command = command.split(":")
-            if len(split_command) < 2:
-                run_plugin(command, "main", args[1:])
-            else:
-                run_plugin(split_command[0], split_command[1], args[1:])
+        try:
+            if _run_profiled(args) is False:
+                sys.exit(1)
+        except BrokenPipeError:
+            # Output was piped into something like `head` that stopped reading early
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            sys.exit(1)
+
+
+def _run_profiled(args):
+    '''
+    Run a command, reporting its phases afterwards when profiling
+    
+    Args:
+        args: The command followed by its arguments
+        
+    Returns:
+        The result of run_command()
+    '''
+    if _PROFILER is None:
+        return run_command(args)
+    try:
+        with _PROFILER.phase("run_command"):
+            return run_command(args)
+    finally:
+        _PROFILER.report(args)
+
+
+def _phase(name):
+    '''
+    Context manager timing a phase of the current command when profiling, and doing
+    nothing otherwise
+    
+    Args:
+        name: Name of the phase
+    '''
+    if _PROFILER is None:
+        return contextlib.nullcontext()
+    return _PROFILER.phase(name)
+
+
+def get_core_commands():
+    '''
+    Return the commands handled by hub itself rather than by a plugin
+    
+    Returns:
+        Dictionary mapping command names to their functions
+    '''
+    return {
+        "init": init,
+        "load": load,
+        "reset": reset,
+        "reload": reload,
+        "serve": serve,
+        "run": run,
+        "bench": bench,
+    }
+
+
+def run_command(args):
+    '''
+    Run a single hub command: a core command or a plugin command
+    
+    Args:
+        args: The command followed by its arguments
+        
+    Returns:
+        False if the command failed, True or None otherwise
+    '''
+    command = args[0]
+    commands = get_core_commands()
+    
+    if command in commands:
+        return commands[command](args[1:])
+    return run_plugin(*_split_plugin_command(args))
+
+
+def _split_plugin_command(args):
+    '''
+    Split a plugin command line into plugin name, command and arguments
+    
+    Args:
+        args: The command ("plugin" or "plugin:command") followed by its arguments
+        
+    Returns:
+        Tuple of (plugin name, command, arguments)
+    '''
+    split_command = args[0].split(":")
+    if len(split_command) < 2:
+        return args[0], "main", args[1:]
+    return split_command[0], split_command[1], args[1:]
 
 
 def run_plugin(plugin_name, cmd, args):
@@ -104,11 +211,25 @@ def run_plugin(plugin_name, cmd, args):
         plugin_name: Name of the plugin to load
         cmd: Command within the plugin to execute
         args: Arguments to pass to the command
+        
+    Returns:
+        True if the command ran, False otherwise
     '''
-    plugin_API_register()
-    if ensure_plugin_exists(plugin_name):
-        if module := register_plugin_to_manifest(plugin_name):
-            execute_plugin_command(module, cmd, args)
+    with _phase("plugin_API_register"):
+        plugin_API_register()
+    with _phase("ensure_plugin_exists"):
+        exists = ensure_plugin_exists(plugin_name)
+    if exists:
+        # The index only lists functions defined in the plugin; imported functions,
+        # partials and callable objects are found by execute_plugin_command()
+        with _phase("register_plugin_to_manifest"):
+            module = register_plugin_to_manifest(plugin_name)
+        if module:
+            with _phase(f"command {plugin_name}:{cmd}"):
+                if _PROFILER is not None:
+                    return _PROFILER.call(execute_plugin_command, module, cmd, args)
+                return execute_plugin_command(module, cmd, args)
+    return False
 
 
 def ensure_plugin_exists(plugin_name):
@@ -124,7 +245,8 @@ def ensure_plugin_exists(plugin_name):
     config_dir = get_config_dir()
     plugin_path = os.path.join(config_dir, "plugins", plugin_name + ".py")
     if not os.path.exists(plugin_path) or DEBUG:
-        move_plugins_to_config()
+        with _phase("move_plugins_to_config"):
+            move_plugins_to_config()
     return os.path.exists(plugin_path)
 
 
@@ -139,33 +261,20 @@ def register_plugin_to_manifest(plugin_name):
         The loaded module if successful, None otherwise
     '''
     config_dir = get_config_dir()
-    manifest = os.path.join(config_dir, "manifest.json")
-    if not os.path.exists(manifest):
-        with open(manifest, "w", encoding="UTF-8") as file:
-            file.write("{}")
-    
-    with open(manifest, "r", encoding="UTF-8") as file:
-        manifest_data = json.load(file)
-        plugin_path = os.path.join(config_dir, "plugins", plugin_name + ".py")
+    plugin_path = os.path.join(config_dir, "plugins", plugin_name + ".py")
     
     try:
-        spec = importlib.util.spec_from_file_location(plugin_name, plugin_path)
-        if spec is None or spec.loader is None:
-            raise Exception(f"Could not load plugin '{plugin_name}'.")  # pylint: disable=broad-exception-raised
-        
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        if plugin_name not in manifest_data:
-            try:
-                plugin_id = module.ID  # pylint: disable=C0103
-                manifest_data[plugin_id] = {}
-            except AttributeError:
-                print(f"Plugin '{plugin_name}' is missing an ID attribute.")
-                return None
-            
-            with open(manifest, "w", encoding="UTF-8") as file:
-                json.dump(manifest_data, file, indent=4)
+        module = load_plugin_module(plugin_name, plugin_path)
+        
+        if not hasattr(module, "ID"):
+            print(f"Plugin '{plugin_name}' is missing an ID attribute.")
+            return None
+        
+        manifest_data = read_manifest()
+        record = manifest_data.get(plugin_name + ".py")
+        if not record or record.get("id") != module.ID:
+            manifest_data[plugin_name + ".py"] = _index_plugin(plugin_name, plugin_path, os.stat(plugin_path))
+            write_manifest(manifest_data)
         
         return module
     
@@ -174,6 +283,436 @@ def register_plugin_to_manifest(plugin_name):
         return None
 
 
+def load_plugin_module(plugin_name, plugin_path):
+    '''
+    Import a plugin file, reusing the module imported earlier in this session
+    as long as the file's size and modification time are unchanged
+    
+    Args:
+        plugin_name: Name of the plugin (file name without ".py")
+        plugin_path: Path to the plugin file
+        
+    Returns:
+        The loaded module
+    '''
+    stat = os.stat(plugin_path)
+    cached = _MODULES.get(plugin_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    
+    spec = importlib.util.spec_from_file_location(plugin_name, plugin_path)
+    if spec is None or spec.loader is None:
+        raise Exception(f"Could not load plugin '{plugin_name}'.")  # pylint: disable=broad-exception-raised
+    
+    module = importlib.util.module_from_spec(spec)
+    with _phase(f"import {plugin_name}"):
+        exec(_get_plugin_code(plugin_name, plugin_path), module.__dict__)  # pylint: disable=exec-used
+    _MODULES[plugin_path] = (stat.st_mtime_ns, stat.st_size, module)
+    return module
+
+
+def _get_plugin_code(plugin_name, plugin_path):
+    '''
+    Return the code object for a plugin file, using hub's bytecode cache.
+    Cached files are keyed by the hash of the plugin source, so a copied or touched
+    plugin still hits the cache and an edited one never loads stale code.
+    
+    Args:
+        plugin_name: Name of the plugin (file name without ".py")
+        plugin_path: Path to the plugin file
+        
+    Returns:
+        The compiled code object
+    '''
+    with open(plugin_path, "rb") as file:
+        source = file.read()
+    
+    source_hash = importlib.util.source_hash(source)
+    header = importlib.util.MAGIC_NUMBER + source_hash
+    cache_dir = os.path.join(get_cache_dir(), "bytecode")
+    cache_path = os.path.join(
+        cache_dir,
+        f"{plugin_name}.{source_hash.hex()}.{sys.implementation.cache_tag}.pyc"
+    )
+    
+    try:
+        with open(cache_path, "rb") as file:
+            data = file.read()
+        if data[:len(header)] == header:
+            return marshal.loads(data[len(header):])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    
+    code = compile(source, plugin_path, "exec", dont_inherit=True)
+    if sys.dont_write_bytecode:
+        return code
+    
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Drop bytecode cached for older versions of this plugin
+        prefix = plugin_name + "."
+        suffix = f".{sys.implementation.cache_tag}.pyc"
+        for filename in os.listdir(cache_dir):
+            if filename.startswith(prefix) and filename.endswith(suffix) and filename.count(".") == 3:
+                os.remove(os.path.join(cache_dir, filename))
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header + marshal.dumps(code))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+    return code
+
+
+def read_manifest():
+    '''
+    Read the plugin manifest, an index of plugin files keyed by file name
+    
+    Returns:
+        Dictionary mapping plugin file names to their index records
+    '''
+    manifest = os.path.join(get_config_dir(), "manifest.json")
+    try:
+        stat = os.stat(manifest)
+        if _MANIFEST_CACHE.get(manifest, (None,))[0] == (stat.st_mtime_ns, stat.st_size):
+            return dict(_MANIFEST_CACHE[manifest][1])
+        with open(manifest, "r", encoding="UTF-8") as file:
+            manifest_data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    # Manifests written by older versions were keyed by plugin ID; drop those entries
+    manifest_data = {
+        key: value
+        for key, value in manifest_data.items()
+        if key.endswith(".py") and isinstance(value, dict)
+    }
+    _MANIFEST_CACHE[manifest] = ((stat.st_mtime_ns, stat.st_size), manifest_data)
+    return dict(manifest_data)
+
+
+def write_manifest(manifest_data):
+    '''
+    Write the plugin manifest
+    
+    Args:
+        manifest_data: Dictionary mapping plugin file names to their index records
+    '''
+    manifest = os.path.join(get_config_dir(), "manifest.json")
+    # Readers in other hub processes never see a half-written index
+    atomic_write(manifest, json.dumps(manifest_data, indent=4), durable=False)
+    stat = os.stat(manifest)
+    _MANIFEST_CACHE[manifest] = ((stat.st_mtime_ns, stat.st_size), dict(manifest_data))
+
+
+def refresh_manifest():
+    '''
+    Bring the manifest up to date with the plugins directory.
+    Files whose size and modification time are unchanged are not read at all, and files
+    whose content hash is unchanged are not imported.
+    
+    Returns:
+        Dictionary mapping plugin file names to their index records
+    '''
+    config_dir = get_config_dir()
+    plugin_path = os.path.join(config_dir, "plugins")
+    if not os.path.exists(plugin_path):
+        with _phase("move_plugins_to_config"):
+            move_plugins_to_config()
+    
+    manifest_data = read_manifest()
+    fresh = {}
+    changed = False
+    for entry in os.scandir(plugin_path):
+        filename = entry.name
+        if not filename.endswith(".py") or filename.startswith("__"):
+            continue
+        
+        stat = entry.stat()
+        record = manifest_data.get(filename)
+        if record and record.get("format") != MANIFEST_FORMAT:
+            record = None
+        if record and record.get("mtime_ns") == stat.st_mtime_ns and record.get("size") == stat.st_size:
+            fresh[filename] = record
+            continue
+        
+        with _phase(f"index {filename[:-3]}"):
+            fresh[filename] = _index_plugin(filename[:-3], entry.path, stat, record)
+        changed = True
+    
+    if changed or fresh.keys() != manifest_data.keys():
+        write_manifest(fresh)
+    return fresh
+
+
+def get_plugin_index():
+    '''
+    Return the plugin index so plugins can inspect other plugins without importing them
+    
+    Returns:
+        Dictionary mapping plugin file names to records with "id", "version", "commands",
+        "meta" and "api" entries
+    '''
+    return refresh_manifest()
+
+
+def _index_plugin(plugin_name, plugin_path, stat, previous=None):
+    '''
+    Build the manifest record for a plugin file
+    
+    Args:
+        plugin_name: Name of the plugin (file name without ".py")
+        plugin_path: Path to the plugin file
+        stat: os.stat_result of the plugin file
+        previous: The record previously stored for this file, if any
+        
+    Returns:
+        Dictionary describing the plugin
+    '''
+    import hashlib  # pylint: disable=import-outside-toplevel
+    with open(plugin_path, "rb") as file:
+        source = file.read()
+    digest = hashlib.sha256(source).hexdigest()
+    
+    if previous and previous.get("sha256") == digest and "error" not in previous:
+        # Only the timestamp changed (touched or copied); the recorded exports still hold
+        return dict(previous, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    
+    record = {
+        "format": MANIFEST_FORMAT,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": digest,
+    }
+    description = _describe_plugin_source(source, plugin_path)
+    if description is not None:
+        record.update(description)
+        return record
+    try:
+        module = load_plugin_module(plugin_name, plugin_path)
+        record.update(_describe_plugin_module(module))
+    except Exception as e:  # pylint: disable=broad-except
+        record["error"] = str(e)
+    return record
+
+
+def _describe_plugin_module(module):
+    '''
+    Collect the metadata of a loaded plugin module
+    
+    Args:
+        module: The loaded plugin module
+        
+    Returns:
+        Dictionary with the plugin ID, version triple, public commands,
+        meta_data() output, hub_add_api() key names and the commands declared
+        safe to run concurrently in PARALLEL
+    '''
+    plugin_id = getattr(module, "ID", None)
+    version = None
+    if all(hasattr(module, name) for name in ("VMAJOR", "VMINOR", "VPATCH")):
+        version = [module.VMAJOR, module.VMINOR, module.VPATCH]
+    
+    commands = sorted(
+        _command_name(name)
+        for name, value in vars(module).items()
+        if isinstance(value, types.FunctionType)
+        and value.__module__ == module.__name__
+        and not name.startswith("_")
+        and name not in ("meta_data", "hub_add_api")
+    )
+    
+    meta = None
+    if hasattr(module, "meta_data"):
+        try:
+            meta = json.loads(json.dumps(module.meta_data(), default=str))
+        except Exception:  # pylint: disable=broad-except
+            meta = {}
+    
+    api = None
+    if plugin_id is not None and hasattr(module, "hub_add_api"):
+        api = list(module.hub_add_api())
+    
+    parallel = {
+        name: mode
+        for name, mode in getattr(module, "PARALLEL", {}).items()
+        if name in commands and mode in ("thread", "process")
+    }
+    
+    return {
+        "id": plugin_id,
+        "version": version,
+        "commands": commands,
+        "meta": meta,
+        "api": api,
+        "parallel": parallel,
+    }
+
+
+def _describe_plugin_source(source, plugin_path):
+    '''
+    Collect the metadata of a plugin without importing it, by reading its source. This
+    works for the common plugin layout: module-level literal constants, plain function
+    definitions, and meta_data() / hub_add_api() that return a literal dict (meta_data
+    may use __file__). Anything that could define or rebind commands at import time
+    (decorators, conditionals, loops, aliases) makes this give up.
+    
+    Args:
+        source: The plugin source code, as bytes
+        plugin_path: Path to the plugin file, the value of __file__
+        
+    Returns:
+        The same dictionary as _describe_plugin_module(), or None if the plugin has to be
+        imported to describe it
+    '''
+    import ast  # pylint: disable=import-outside-toplevel
+    try:
+        tree = ast.parse(source, plugin_path)
+    except (SyntaxError, ValueError):
+        return None
+    
+    constants = {"__file__": plugin_path}
+    dynamic = set()
+    functions = {}
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.ClassDef, ast.Pass)):
+            continue
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.decorator_list:
+            functions[node.name] = node
+            constants.pop(node.name, None)
+            dynamic.discard(node.name)
+            continue
+        if not isinstance(node, (ast.Assign, ast.AnnAssign)) or node.value is None:
+            return None
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        if not all(isinstance(target, ast.Name) for target in targets):
+            return None
+        try:
+            value = _literal(node.value, constants)
+            literal = True
+        except ValueError:
+            # A call (e.g. re.compile(...)) is assumed not to produce a command, but a
+            # public name bound to a name, attribute or lambda may well be one
+            if not isinstance(node.value, ast.Call) and any(not target.id.startswith("_") for target in targets):
+                return None
+            literal = False
+        for target in targets:
+            functions.pop(target.id, None)
+            if literal:
+                constants[target.id] = value
+                dynamic.discard(target.id)
+            else:
+                constants.pop(target.id, None)
+                dynamic.add(target.id)
+    if dynamic & {"ID", "VMAJOR", "VMINOR", "VPATCH", "PARALLEL"}:
+        return None
+    
+    try:
+        plugin_id = constants.get("ID")
+        version = None
+        if all(name in constants for name in ("VMAJOR", "VMINOR", "VPATCH")):
+            version = [constants["VMAJOR"], constants["VMINOR"], constants["VPATCH"]]
+        meta = None
+        if "meta_data" in functions:
+            meta = json.loads(json.dumps(_literal(_returned_dict(functions["meta_data"]), constants), default=str))
+        api = None
+        if plugin_id is not None and "hub_add_api" in functions:
+            keys = _returned_dict(functions["hub_add_api"]).keys
+            if not all(isinstance(key, ast.Constant) for key in keys):
+                return None
+            api = [key.value for key in keys]
+    except ValueError:
+        return None
+    
+    commands = sorted(
+        _command_name(name)
+        for name in functions
+        if not name.startswith("_") and name not in ("meta_data", "hub_add_api")
+    )
+    parallel = constants.get("PARALLEL", {})
+    parallel = {
+        name: mode
+        for name, mode in (parallel.items() if isinstance(parallel, dict) else [])
+        if name in commands and mode in ("thread", "process")
+    }
+    
+    return {
+        "id": plugin_id,
+        "version": version,
+        "commands": commands,
+        "meta": meta,
+        "api": api,
+        "parallel": parallel,
+    }
+
+
+def _returned_dict(function):
+    '''
+    Find the dict literal a function returns
+    
+    Args:
+        function: The ast function definition
+        
+    Returns:
+        The ast.Dict node
+        
+    Raises:
+        ValueError: The function does anything but return a dict literal
+    '''
+    import ast  # pylint: disable=import-outside-toplevel
+    body = function.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+    if len(body) != 1 or not isinstance(body[0], ast.Return) or not isinstance(body[0].value, ast.Dict):
+        raise ValueError(f"{function.name}() does not return a dict literal")
+    return body[0].value
+
+
+def _literal(node, constants):
+    '''
+    Evaluate a literal expression from a plugin's source
+    
+    Args:
+        node: The ast expression
+        constants: Values of the module-level names the expression may refer to
+        
+    Returns:
+        The value of the expression
+        
+    Raises:
+        ValueError: The expression is not a literal
+    '''
+    import ast  # pylint: disable=import-outside-toplevel
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    if isinstance(node, ast.Dict):
+        if None in node.keys:
+            raise ValueError("dict unpacking")
+        return {
+            _literal(key, constants): _literal(value, constants)
+            for key, value in zip(node.keys, node.values)
+        }
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        values = [_literal(element, constants) for element in node.elts]
+        return {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)](values)
+    if isinstance(node, ast.BinOp) and type(node.op).__name__ in _ARITHMETIC:
+        # Sizes and intervals such as 64 * 1024; no powers, which could be huge
+        left = _literal(node.left, constants)
+        right = _literal(node.right, constants)
+        numbers = all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (left, right))
+        if not numbers:
+            raise ValueError("arithmetic on non-numbers")
+        try:
+            return _ARITHMETIC[type(node.op).__name__](left, right)
+        except ArithmeticError as e:
+            raise ValueError(str(e)) from e
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError) as e:
+        raise ValueError(str(e)) from e
+
+
 def execute_plugin_command(module, command, args):
     '''
     Execute a specific command of a plugin
@@ -182,19 +721,180 @@ def execute_plugin_command(module, command, args):
         module: The loaded plugin module
         command: The command to execute
         args: Arguments to pass to the command
+        
+    Returns:
+        True if the plugin has the command, False otherwise
     '''
-    if hasattr(module, command):
-        cmd = getattr(module, command)
-        result = cmd(get_API_dict(), args)
-        if result is None:
-            return
-        if isinstance(result, list):
+    cmd = _get_command(module, command)
+    if cmd is not None:
+        emit_result(_resolve_async(cmd(get_API_dict(), args)))
+        return True
+    print(f"Plugin '{module.ID}' does not have the command {command}.")
+    return False
+
+
+def _get_command(module, command):
+    '''
+    Find the function implementing a plugin command. Commands whose name is a Python
+    keyword (e.g. `import`) are implemented by the name with a trailing underscore.
+    
+    Args:
+        module: The loaded plugin module
+        command: The command name
+        
+    Returns:
+        The command function, or None if the plugin does not have the command
+    '''
+    if keyword.iskeyword(command):
+        command += "_"
+    return getattr(module, command, None)
+
+
+def _command_name(function_name):
+    '''
+    Name of the command a plugin function implements, see _get_command()
+    
+    Args:
+        function_name: Name of the function
+        
+    Returns:
+        The function name without the trailing underscore of a keyword command
+    '''
+    if function_name.endswith("_") and keyword.iskeyword(function_name[:-1]):
+        return function_name[:-1]
+    return function_name
+
+
+def _get_event_loop():
+    '''
+    Get the event loop async plugin commands run on, starting it in a daemon thread the
+    first time. The loop lives as long as the process, so it is shared by all the commands
+    of a REPL session, a `hub run` batch or the daemon, and commands submitted from several
+    threads (`hub run --jobs`) run on it concurrently.
+    
+    Returns:
+        The running asyncio event loop
+    '''
+    global _EVENT_LOOP  # pylint: disable=global-statement
+    # A forked `hub run --jobs` worker inherits the loop but not the thread running it
+    if _EVENT_LOOP is None or _EVENT_LOOP[0] != os.getpid():
+        import asyncio  # pylint: disable=import-outside-toplevel
+        import threading  # pylint: disable=import-outside-toplevel
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="hub-event-loop", daemon=True).start()
+        _EVENT_LOOP = (os.getpid(), loop)
+    return _EVENT_LOOP[1]
+
+
+def _run_on_event_loop(awaitable):
+    '''
+    Run an awaitable on the shared event loop and wait for its result
+    
+    Args:
+        awaitable: A coroutine
+        
+    Returns:
+        The coroutine's result
+    '''
+    import asyncio  # pylint: disable=import-outside-toplevel
+    future = asyncio.run_coroutine_threadsafe(awaitable, _get_event_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # Interrupted (e.g. Ctrl-C in the REPL): cancel the task rather than leaving it running
+        future.cancel()
+        raise
+
+
+def _resolve_async(result):
+    '''
+    Turn the result of an async plugin command into one emit_result() understands.
+    Coroutine functions are awaited on the shared event loop; async generators are
+    iterated there one item at a time, so their output still streams.
+    
+    Args:
+        result: The value returned by a plugin command
+        
+    Returns:
+        The coroutine's result, a line iterator over the async generator, or the result
+        unchanged if it is not async
+    '''
+    if hasattr(result, "__anext__"):
+        return _AsyncIterator(result)
+    if isinstance(result, types.CoroutineType):
+        return _resolve_async(_run_on_event_loop(result))
+    return result
+
+
+class _AsyncIterator(Iterator):
+    '''
+    Iterator over an async generator, stepping it on the shared event loop
+    '''
+    
+    def __init__(self, agen):
+        self._agen = agen
+    
+    def __next__(self):
+        try:
+            return _run_on_event_loop(self._agen.__anext__())
+        except StopAsyncIteration:
+            raise StopIteration from None
+    
+    def close(self):
+        '''Close the async generator, running its cleanup on the event loop.'''
+        if hasattr(self._agen, "aclose"):
+            _run_on_event_loop(self._agen.aclose())
+
+
+def emit_result(result):
+    '''
+    Print the result of a plugin command. Iterators and file-like objects are streamed
+    so large results print with constant memory and the first output appears immediately.
+    
+    Args:
+        result: None, a str, a list or iterator of lines, or a file-like object
+                (text or binary, decoded as UTF-8) whose content is printed as-is
+    '''
+    if result is None:
+        return
+    if hasattr(result, "read"):
+        _stream_file(result)
+    elif isinstance(result, (list, Iterator)):
+        try:
             for line in result:
                 print(line)
-        else:
-            print(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
     else:
-        print(f"Plugin '{module.ID}' does not have the command {command}.")
+        print(result)
+
+
+def _stream_file(file):
+    '''
+    Copy a file-like object to stdout in chunks and close it
+    
+    Args:
+        file: File-like object returning str or bytes from read()
+    '''
+    decoder = codecs.getincrementaldecoder("UTF-8")(errors="replace")
+    last = ""
+    try:
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk)
+            if chunk:
+                sys.stdout.write(chunk)
+                last = chunk
+        chunk = decoder.decode(b"", final=True)
+        if chunk:
+            sys.stdout.write(chunk)
+            last = chunk
+    finally:
+        file.close()
+    # Match print(): the output always ends with a newline
+    if not last.endswith("\n"):
+        sys.stdout.write("\n")
 
 
 def move_plugins_to_config():
@@ -218,20 +918,97 @@ def move_plugins_to_config():
             shutil.copy2(source_path, destination_path)
 
 
+def atomic_write(path, data, durable=True):
+    '''
+    Replace a file's content atomically: the data is written to a temporary file in the
+    same directory which is then renamed over the target, so readers and crashes see
+    either the old or the new content, never a mix
+    
+    Args:
+        path: Path of the file to write
+        data: Content to write, str (written as UTF-8), bytes, or a binary file object
+              copied in chunks so large content is never held in memory
+        durable: Flush the data to disk before the rename so it survives a power loss
+    
+    The file keeps the permissions of the file it replaces; new files get the usual
+    0666 less the umask, like open() would give them.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_path = os.path.join(directory, f".hub-tmp-{os.getpid()}-{os.urandom(8).hex()}")
+    # Created like open() does, so the umask applies (tempfile.mkstemp would force 0600)
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        with os.fdopen(fd, "wb") as file:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, file, STREAM_CHUNK_SIZE)
+            else:
+                file.write(data.encode("UTF-8") if isinstance(data, str) else data)
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def download(url, sha256=None, session=None):
+    '''
+    Download a URL through hub's shared download cache (see hub/fetch.py)
+    
+    Args:
+        url: The URL to download
+        sha256: Expected sha256 hex digest of the content, if known
+        session: Optional requests session to download with
+        
+    Returns:
+        Tuple of (path of the cached file, its sha256 hex digest); copy the file rather
+        than moving or modifying it
+        
+    Raises:
+        OSError: The download failed, or the URL is not cached while HUB_OFFLINE is set
+    '''
+    from hub import fetch  # pylint: disable=import-outside-toplevel
+    return fetch.DownloadCache(get_cache_dir()).fetch(url, sha256, session)
+
+
 def get_data_local_dir():
     '''
     Ensure the data directory exists. Supports local .mem directory if initialized. Return it.
+    The .mem lookup is not memoized: another process (a shell next to `hub serve`, or one
+    next to a REPL) may create or remove .mem directories at any time, and the walk costs
+    one isdir per parent. The configured data directory is memoized by get_data_dir().
     
     Returns:
         Path to the data directory (local or configured)
     '''
-    # 1. Check for local .mem directory
-    if os.path.exists(os.path.join(os.getcwd(), ".mem")):
-        data_dir = os.path.join(os.getcwd(), ".mem")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-        return data_dir
-    return get_data_dir()
+    # 1. Check for a local .mem directory here or in a parent directory
+    return _find_local_data_dir(os.getcwd()) or get_data_dir()
+
+
+def _find_local_data_dir(directory):
+    '''
+    Find the nearest .mem directory, walking up from a directory like git does
+    
+    Args:
+        directory: Directory to start from
+        
+    Returns:
+        Path to the .mem directory, or None if there is none
+    '''
+    while True:
+        data_dir = os.path.join(directory, ".mem")
+        if os.path.isdir(data_dir):
+            return data_dir
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
 
 
 def get_data_dir():
@@ -244,10 +1021,16 @@ def get_data_dir():
     # 2. Check for configured data directory
     conf = get_config_dir()
     data_dir_file = os.path.join(conf, "data_dir.conf")
-    if os.path.exists(data_dir_file):
+    conf_stamp = _file_stamp(data_dir_file)
+    cached = _DIR_CACHE.get("data")
+    if cached and cached[0] == conf_stamp:
+        return cached[1]
+    
+    if conf_stamp is not None:
         with open(data_dir_file, "r", encoding="UTF-8") as file:
             data_dir = file.read().strip()
             if os.path.exists(data_dir) and os.path.isdir(data_dir):
+                _DIR_CACHE["data"] = (conf_stamp, data_dir)
                 return data_dir
 
     # 3. Fallback to default system data directory
@@ -260,6 +1043,7 @@ def get_data_dir():
     
     if not os.path.exists(app_data):
         os.makedirs(app_data)
+    _DIR_CACHE["data"] = (conf_stamp, app_data)
     return app_data
 
 
@@ -270,18 +1054,72 @@ def get_config_dir():
     Returns:
         Path to the config directory
     '''
+    if "config" in _DIR_CACHE:
+        return _DIR_CACHE["config"]
+    
+    with _phase("get_config_dir"):
+        if os.name == 'nt':  # Windows
+            config_dir = os.environ.get("APPDATA", os.path.expanduser("~"))
+            app_config = os.path.join(config_dir, "mem-note")
+        else:  # Linux/Mac
+            config_dir = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
+            app_config = os.path.join(config_dir, "hub")
+            if DEBUG:
+                app_config = os.path.join(config_dir, "hub-debug")
+        
+        if not os.path.exists(app_config):
+            os.makedirs(app_config)
+    _DIR_CACHE["config"] = app_config
+    return app_config
+
+
+def clear_dir_cache():
+    '''
+    Forget memoized directory resolution, after init, load or reset changed it
+    '''
+    _DIR_CACHE.clear()
+
+
+def _file_stamp(path):
+    '''
+    Return a cheap change marker for a file
+    
+    Args:
+        path: Path to the file
+        
+    Returns:
+        Tuple of modification time and size, or None if the file does not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_cache_dir():
+    '''
+    Ensure the cache directory exists
+    
+    Returns:
+        Path to the cache directory
+    '''
+    if "cache" in _DIR_CACHE:
+        return _DIR_CACHE["cache"]
+    
     if os.name == 'nt':  # Windows
-        config_dir = os.environ.get("APPDATA", os.path.expanduser("~"))
-        app_config = os.path.join(config_dir, "mem-note")
+        cache_dir = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+        app_cache = os.path.join(cache_dir, "mem-note", "cache")
     else:  # Linux/Mac
-        config_dir = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
-        app_config = os.path.join(config_dir, "hub")
+        cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        app_cache = os.path.join(cache_dir, "hub")
         if DEBUG:
-            app_config = os.path.join(config_dir, "hub-debug")
+            app_cache = os.path.join(cache_dir, "hub-debug")
     
-    if not os.path.exists(app_config):
-        os.makedirs(app_config)
-    return app_config
+    if not os.path.exists(app_cache):
+        os.makedirs(app_cache)
+    _DIR_CACHE["cache"] = app_cache
+    return app_cache
 
 
 def init(args=None):  # pylint: disable=unused-argument
@@ -295,6 +1133,7 @@ def init(args=None):  # pylint: disable=unused-argument
     data_dir = os.path.join(cwd, ".mem")
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
+        clear_dir_cache()
         print(f"Initialized memory directory at {data_dir}")
     else:
         print("This directory is already initialized.")
@@ -316,12 +1155,14 @@ def load(args):
         conf = get_config_dir()
         with open(os.path.join(conf, "data_dir.conf"), "w", encoding="UTF-8") as file:
             file.write(data_dir)
+        clear_dir_cache()
         print(f"Loaded {data_dir} as data directory.")
     elif data_dir == "default":
         conf = get_config_dir()
         data_dir_file = os.path.join(conf, "data_dir.conf")
         if os.path.exists(data_dir_file):
             os.remove(data_dir_file)
+        clear_dir_cache()
         print("Reverted to default data directory.")
     else:
         print(f"Path '{data_dir}' does not exist or is not a directory.")
@@ -338,6 +1179,7 @@ def reset(args):
         print("Usage: hub reset <config|data|bundled-plugins>")
         return
     
+    from prompt_toolkit.shortcuts import prompt  # pylint: disable=import-outside-toplevel
     conf = random.randint(1000000, 9999999)
     print(f"You are about to reset {args[0]}. This action cannot be undone. Type in {conf} to confirm.")
     
@@ -351,10 +1193,12 @@ def reset(args):
         print("Reset cancelled.")
         return
     
+    clear_dir_cache()
     if args[0] == "config":
         config_dir = get_config_dir()
         if os.path.exists(config_dir):
             shutil.rmtree(config_dir)
+            clear_dir_cache()
             print("Configuration reset.")
         else:
             print("No configuration found to reset.")
@@ -363,6 +1207,7 @@ def reset(args):
         data_dir = get_data_dir()
         if os.path.exists(data_dir):
             shutil.rmtree(data_dir)
+            clear_dir_cache()
             print("Data directory reset.")
         else:
             print("No data directory found to reset.")
@@ -373,6 +1218,307 @@ def reset(args):
         print("Bundled plugins reset.")
 
 
+def reload(args):
+    '''
+    Drop cached plugin modules and re-index the plugins from disk
+    
+    Args:
+        args: Optional list of plugin names to reload; all plugins are reloaded when empty
+    '''
+    names = {name[:-3] if name.endswith(".py") else name for name in args or []}
+    for plugin_path in list(_MODULES):
+        if not names or os.path.basename(plugin_path)[:-3] in names:
+            del _MODULES[plugin_path]
+    
+    manifest_data = read_manifest()
+    for filename in list(manifest_data):
+        if not names or filename[:-3] in names:
+            del manifest_data[filename]
+    write_manifest(manifest_data)
+    
+    API.clear()
+    manifest_data = plugin_API_register()
+    if names:
+        missing = sorted(name for name in names if name + ".py" not in manifest_data)
+        for name in missing:
+            print(f"Plugin '{name}' not found.")
+        print(f"Reloaded {len(names) - len(missing)} plugin(s).")
+    else:
+        print(f"Reloaded {len(manifest_data)} plugin(s).")
+
+
+def run(args):
+    '''
+    Run newline-delimited hub commands from a file or stdin in this process, so the plugin
+    registry and modules are loaded once for the whole batch. Blank lines and lines starting
+    with "#" are skipped. Command output goes to stdout; a status line with the timing of
+    each command and a final summary go to stderr.
+    With --jobs N, consecutive commands their plugin declares parallel-safe run concurrently.
+    
+    Args:
+        args: Optional "--jobs N", then the path of the command file, or "-" for stdin
+        
+    Returns:
+        False if any command failed, True otherwise
+    '''
+    jobs = 1
+    if len(args) >= 2 and args[0] in ("--jobs", "-j"):
+        jobs = int(args[1]) if args[1].isdigit() else 0
+        args = args[2:]
+    if not args or jobs < 1:
+        print("Usage: hub run [--jobs N] <file|->")
+        return False
+    
+    try:
+        source = sys.stdin if args[0] == "-" else open(args[0], "r", encoding="UTF-8")  # pylint: disable=consider-using-with
+    except OSError as e:
+        print(f"Cannot read commands from '{args[0]}': {e}")
+        return False
+    
+    runner = _BatchRunner(jobs)
+    started = time.perf_counter()
+    try:
+        for line_number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            command_args = line.split()
+            if command_args[0].lower() == "exit":
+                break
+            runner.submit(line_number, line, command_args)
+        runner.flush()
+    finally:
+        runner.close()
+        if source is not sys.stdin:
+            source.close()
+    
+    total = time.perf_counter() - started
+    print(f"{runner.succeeded} succeeded, {runner.failed} failed in {total:.2f} s", file=sys.stderr)
+    return runner.failed == 0
+
+
+class _BatchRunner:
+    '''
+    Executes the commands of a `hub run` batch in order. Runs of consecutive commands that
+    their plugin declares parallel-safe (a module-level PARALLEL = {"command": "thread"} or
+    "process" mapping) are fanned out over a thread or process pool, and their output is
+    printed in submission order once each finishes.
+    A group only holds one command of one plugin, and never two commands with the same first
+    argument, so reordering it cannot change the outcome: `notes:new k v` is never run
+    alongside a `notes:recall k` or another `notes:new k` queued after it.
+    '''
+    
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.succeeded = 0
+        self.failed = 0
+        self._group = []
+        self._mode = None
+        self._command = None
+        self._targets = set()
+        self._executors = {}
+    
+    def submit(self, line_number, line, command_args):
+        '''Queue or run one command.'''
+        mode = self._parallel_mode(command_args) if self.jobs > 1 else None
+        command = command_args[0]
+        target = command_args[1] if len(command_args) > 1 else None
+        if self._group and (
+            mode != self._mode
+            or command != self._command
+            or target in self._targets
+            or len(self._group) >= self.jobs * 8
+        ):
+            self.flush()
+        if mode is None:
+            self._run_one(line_number, line, command_args)
+        else:
+            self._mode = mode
+            self._command = command
+            self._targets.add(target)
+            self._group.append((line_number, line, command_args))
+    
+    def flush(self):
+        '''Run the queued parallel-safe commands and print their output in order.'''
+        group, self._group = self._group, []
+        self._targets = set()
+        if not group:
+            return
+        
+        executor = self._executor(self._mode)
+        if self._mode == "thread":
+            # Commands reach other plugins through the API registry, as under run_plugin();
+            # process workers register their own
+            plugin_API_register()
+        futures = []
+        for _, _, command_args in group:
+            plugin_name, cmd, cmd_args = _split_plugin_command(command_args)
+            if self._mode == "process":
+                futures.append(executor.submit(_run_in_worker, plugin_name, cmd, cmd_args, os.getcwd()))
+                continue
+            # Import in this thread so workers never race to import the same plugin
+            module = register_plugin_to_manifest(plugin_name)
+            if module is None:
+                futures.append(None)
+                continue
+            futures.append(executor.submit(_timed_call, _get_command(module, cmd), get_API_dict(), cmd_args))
+        
+        for (line_number, line, _), future in zip(group, futures):
+            ok = False
+            elapsed = 0.0
+            if future is not None:
+                try:
+                    elapsed, result = future.result()
+                    emit_result(result)
+                    ok = True
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f"Error: {e}", file=sys.stderr)
+            self._report(ok, elapsed, line_number, line)
+    
+    def close(self):
+        '''Shut down the worker pools.'''
+        for executor in self._executors.values():
+            executor.shutdown()
+        self._executors = {}
+    
+    def _run_one(self, line_number, line, command_args):
+        start = time.perf_counter()
+        try:
+            if command_args[0] == "run":
+                print("Nested 'run' commands are not supported.", file=sys.stderr)
+                ok = False
+            else:
+                ok = run_command(command_args) is not False
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"Error: {e}", file=sys.stderr)
+            ok = False
+        self._report(ok, time.perf_counter() - start, line_number, line)
+    
+    def _report(self, ok, elapsed, line_number, line):
+        if ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        print(f"[{'ok' if ok else 'FAIL'} {elapsed * 1000:.1f} ms] {line_number}: {line}", file=sys.stderr)
+    
+    def _parallel_mode(self, command_args):
+        if command_args[0] in get_core_commands():
+            return None
+        plugin_name, cmd, _ = _split_plugin_command(command_args)
+        record = refresh_manifest().get(plugin_name + ".py") or {}
+        return (record.get("parallel") or {}).get(cmd)
+    
+    def _executor(self, mode):
+        if mode not in self._executors:
+            import concurrent.futures  # pylint: disable=import-outside-toplevel
+            if mode == "process":
+                self._executors[mode] = concurrent.futures.ProcessPoolExecutor(self.jobs)
+            else:
+                self._executors[mode] = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        return self._executors[mode]
+
+
+def _timed_call(func, *args):
+    '''
+    Call a plugin command in a worker thread of a `hub run --jobs` batch and time it
+    
+    Returns:
+        Tuple of (elapsed seconds, result), with streamed results read in the worker since
+        they may hold resources bound to its thread, such as a SQLite connection
+    '''
+    start = time.perf_counter()
+    result = _materialize(_resolve_async(func(*args)))
+    return time.perf_counter() - start, result
+
+
+def _materialize(result):
+    '''
+    Read a streamed command result (file-like object or iterator) into memory
+    
+    Args:
+        result: The value returned by a plugin command
+        
+    Returns:
+        The result as a string or list, or unchanged if it was not streamed
+    '''
+    if hasattr(result, "read"):
+        with contextlib.closing(result):
+            result = result.read()
+        if isinstance(result, bytes):
+            result = result.decode("UTF-8", errors="replace")
+    elif isinstance(result, Iterator):
+        result = [line for line in result]
+    return result
+
+
+def _run_in_worker(plugin_name, cmd, args, cwd):
+    '''
+    Run a plugin command in a worker process of a `hub run --jobs` batch
+    
+    Args:
+        plugin_name: Name of the plugin
+        cmd: Command within the plugin to execute
+        args: Arguments to pass to the command
+        cwd: Working directory of the batch, which decides the local data directory
+        
+    Returns:
+        Tuple of (elapsed seconds, result), with streamed results read into memory so
+        they can be sent back to the parent process
+    '''
+    os.chdir(cwd)
+    start = time.perf_counter()
+    plugin_API_register()
+    module = register_plugin_to_manifest(plugin_name)
+    if module is None:
+        raise Exception(f"Could not load plugin '{plugin_name}'.")  # pylint: disable=broad-exception-raised
+    result = _materialize(_resolve_async(_get_command(module, cmd)(get_API_dict(), args)))
+    return time.perf_counter() - start, result
+
+
+def bench(args):
+    '''
+    Run hub's benchmark suite (see hub/bench.py) against throwaway directories
+    
+    Args:
+        args: Benchmark options, see `hub bench --help`
+    '''
+    from hub import bench as benchmarks  # pylint: disable=import-outside-toplevel
+    benchmarks.main(args)
+
+
+def serve(args):
+    '''
+    Run the hub daemon, keeping plugins and the API registry loaded between commands
+    
+    Args:
+        args: Empty to start the daemon, or ["stop"] to stop a running one
+    '''
+    from hub import daemon  # pylint: disable=import-outside-toplevel
+    socket_path = get_daemon_socket()
+    if args and args[0] == "stop":
+        if daemon.stop(socket_path):
+            print("Stopped hub daemon.")
+        else:
+            print("No hub daemon is running.")
+        return
+    if args:
+        print("Usage: hub serve [stop]")
+        return
+    
+    plugin_API_register()
+    daemon.serve(socket_path, run_command)
+
+
+def get_daemon_socket():
+    '''
+    Return the path of the hub daemon's Unix socket
+    
+    Returns:
+        Path to the socket inside the config directory
+    '''
+    return os.path.join(get_config_dir(), "hub.sock")
+
+
 def get_API_dict() -> dict:  # pylint: disable=invalid-name
     '''
     Return a dictionary of the hub API commands and variables
@@ -389,48 +1535,75 @@ def get_API_dict() -> dict:  # pylint: disable=invalid-name
             "get_data_dir": get_data_dir,
             "get_data_local_dir": get_data_local_dir,
             "get_config_dir": get_config_dir,
+            "get_cache_dir": get_cache_dir,
+            "get_plugin_index": get_plugin_index,
+            "load_plugin": load_plugin_module,
+            "atomic_write": atomic_write,
+            "download": download,
         }
     return API
 
 
+class LazyPluginAPI(Mapping):
+    '''
+    The hub_add_api() table of a plugin, imported the first time one of its entries is used.
+    Key names come from the manifest so listing them does not import the plugin.
+    '''
+    
+    def __init__(self, plugin_name, plugin_path, keys):
+        self.plugin_name = plugin_name
+        self.plugin_path = plugin_path
+        self._keys = list(keys)
+        self._module = None
+        self._table = None
+    
+    def _load(self):
+        module = load_plugin_module(self.plugin_name, self.plugin_path)
+        if module is not self._module:
+            self._table = dict(module.hub_add_api())
+            self._module = module
+        return self._table
+    
+    def __getitem__(self, key):
+        return self._load()[key]
+    
+    def __iter__(self):
+        return iter(self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __contains__(self, key):
+        return key in self._keys
+    
+    def __repr__(self):
+        return f"LazyPluginAPI({self.plugin_name!r}, {self._keys!r})"
+
+
 def plugin_API_register():  # pylint: disable=invalid-name
     '''
-    Register plugin APIs into the global API dictionary
+    Register plugin APIs into the global API dictionary.
+    Entries are LazyPluginAPI proxies built from the manifest, so no plugin is imported here
+    unless its file changed since it was last indexed.
+    
+    Returns:
+        The refreshed manifest
     '''
     global API  # pylint: disable=global-statement
     API = get_API_dict()
-    config_dir = get_config_dir()
-    plugin_path = os.path.join(config_dir, "plugins")
-    if not os.path.exists(plugin_path):
-        move_plugins_to_config()
+    plugin_path = os.path.join(get_config_dir(), "plugins")
     
-    for filename in os.listdir(plugin_path):
-        if not filename.endswith(".py") or filename.startswith("__"):
+    manifest_data = refresh_manifest()
+    for filename, record in manifest_data.items():
+        if not record.get("id") or record.get("api") is None:
             continue
         
-        plugin_name = filename[:-3]
-        spec = importlib.util.spec_from_file_location(
-            plugin_name,
-            os.path.join(plugin_path, filename)
+        API[record["id"]] = LazyPluginAPI(
+            filename[:-3],
+            os.path.join(plugin_path, filename),
+            record["api"]
         )
-        
-        if spec is None or spec.loader is None:
-            continue
-        
-        module = importlib.util.module_from_spec(spec)
-        if module is None:
-            continue
-        
-        spec.loader.exec_module(module)
-        
-        if not hasattr(module, "ID"):
-            continue
-        
-        if hasattr(module, "hub_add_api"):
-            plugin_api = module.hub_add_api()
-            API[module.ID] = {}
-            for key in plugin_api:
-                API[module.ID][key] = plugin_api[key]
+    return manifest_data
 
 
 if __name__ == "__main__":
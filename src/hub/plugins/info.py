@@ -5,8 +5,8 @@ Public commands:
 - `info` (aliases: `show`) – show metadata for one or more plugins
 
 All public commands return either a `str` or `list[str]`. They do not print directly; printing is handled by `main`.
+Metadata is read from the plugin index kept by `main`, so listing plugins does not import them.
 """
-import importlib.util
 import os
 
 VMAJOR = 0
@@ -31,12 +31,12 @@ def main(api, args):
         return ["No plugins found."]
 
     if not args:
-        return _get_all_plugins_info(plugins_dir, plugins)
+        return _get_all_plugins_info(api, plugins)
 
     # Recognize explicit subcommands
     cmd = args[0].lower()
     if cmd in ("catalog", "list", "ls"):
-        return _get_all_plugins_info(plugins_dir, plugins)
+        return _get_all_plugins_info(api, plugins)
     if cmd in ("info", "show"):
         return info(api, args[1:])
 
@@ -53,7 +53,7 @@ def catalog(api, args):
     plugins = _list_plugins(plugins_dir)
     if not plugins:
         return ["No plugins found."]
-    return _get_all_plugins_info(plugins_dir, plugins)
+    return _get_all_plugins_info(api, plugins)
 
 
 def info(api, args):
@@ -67,12 +67,13 @@ def info(api, args):
     out = []
     config_dir = api["get_config_dir"]()
     plugins_dir = os.path.join(config_dir, "plugins")
+    index = api["get_plugin_index"]()
     for name in args:
         plugin_path = _resolve_plugin_path(plugins_dir, name)
         if not plugin_path:
             out.append(f"Plugin '{name}' not found.")
             continue
-        out.extend(_get_plugin_info(name, plugin_path))
+        out.extend(_get_plugin_info(name, plugin_path, index.get(os.path.basename(plugin_path), {})))
         out.append("")  # blank separator between plugin entries
     if out and out[-1] == "":
         out.pop()
@@ -88,17 +89,13 @@ def meta_data():
     }
 
 
-def _get_all_plugins_info(plugins_dir, plugins):
+def _get_all_plugins_info(api, plugins):
     """Return a list of strings with short descriptions for all plugins."""
     out = []
+    index = api["get_plugin_index"]()
     for plugin in sorted(plugins):
-        plugin_path = os.path.join(plugins_dir, plugin)
-        module = _load_module(plugin[:-3], plugin_path)
-        if module and hasattr(module, "meta_data"):
-            try:
-                meta = module.meta_data()
-            except Exception:
-                meta = {}
+        meta = index.get(plugin, {}).get("meta")
+        if meta is not None:
             name = meta.get("name", plugin[:-3])
             description = meta.get("description", "No description.")
             out.append(f"{name}: {description}")
@@ -107,18 +104,18 @@ def _get_all_plugins_info(plugins_dir, plugins):
     return out
 
 
-def _get_plugin_info(name, plugin_path):
+def _get_plugin_info(name, plugin_path, record):
     """Return a list of strings with the metadata for a single plugin."""
     out = []
-    module = _load_module(name if name.endswith('.py') else name, plugin_path)
-    if module and hasattr(module, "meta_data"):
-        try:
-            meta = module.meta_data()
-        except Exception:
-            meta = {}
+    meta = record.get("meta")
+    if meta is not None:
         out.append(f"Name: {meta.get('name', name)}")
         out.append(f"Description: {meta.get('description', 'No description.')}")
         out.append(f"File: {meta.get('file_path', plugin_path)}")
+        if record.get("version"):
+            out.append(f"Version: {'.'.join(str(part) for part in record['version'])}")
+        if record.get("commands"):
+            out.append(f"Commands: {', '.join(record['commands'])}")
         return out
     out.append(f"Plugin '{name}' has no metadata.")
     return out
@@ -140,15 +137,3 @@ def _list_plugins(plugins_dir):
         for filename in os.listdir(plugins_dir)
         if filename.endswith(".py") and not filename.startswith("__")
     ]
-
-
-def _load_module(name, plugin_path):
-    spec = importlib.util.spec_from_file_location(name, plugin_path)
-    if spec is None or spec.loader is None:
-        return None
-    module = importlib.util.module_from_spec(spec)  # type: ignore
-    try:
-        spec.loader.exec_module(module)  # type: ignore
-    except Exception:
-        return None
-    return module
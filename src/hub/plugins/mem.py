@@ -1,17 +1,673 @@
-"""Notes management plugin."""
+"""Notes management plugin.
+
+Notes are kept in the data directory by a storage backend chosen per data directory:
+- `files` (default): one file per note, named after the note
+- `sqlite`: a single `.hub-notes.db` database, for directories with very many notes
+The backend is recorded in `.hub-notes.json`; `notes migrate <backend>` switches it.
+`notes search` uses an inverted index kept in hub's cache directory (outside the data
+directory, so its journal files never disturb the data directory's modification time),
+updated by every change made through hub and reconciled by modification time with notes
+changed outside of it: at once when notes are created, renamed or deleted, and at least
+every RESCAN_INTERVAL seconds for notes edited in place.
+Files whose names start with `.hub-` belong to hub and are never listed as notes.
+`notes export` and `notes import` move notes in bulk as JSON Lines or tar streams, one
+note at a time on export and in batched writes on import, so memory use stays constant.
+`notes compress` opts a data directory into storing note bodies above a size threshold
+compressed with zlib or lzma, behind a short header; they are decompressed transparently,
+and incrementally when recalled.
+"""
+import fnmatch
+import hashlib
+import io
+import json
+import math
 import os
+import re
+import sys
+import threading
+import time
 VMAJOR = 0
 VMINOR = 4
 VPATCH = 0
 ID = "com.flench04.mem"
+
+RESERVED_PREFIX = ".hub-"
+CONFIG_FILE = ".hub-notes.json"
+BACKENDS = ("files", "sqlite")
+# Commands `hub run --jobs N` may run concurrently on a thread pool
+PARALLEL = {"new": "thread", "recall": "thread", "search": "thread"}
+# Open stores and search indexes, reused across commands while hub keeps this module loaded
+_STORES = {}
+_INDEXES = {}
+TOKEN_RE = re.compile(r"\w+")
+# Notes edited in place leave the data directory untouched; look for them this often
+RESCAN_INTERVAL = 30
+EXPORT_FORMATS = ("jsonl", "tar")
+# Compressed bodies start with this header followed by a method byte; text never starts with NUL
+COMPRESSED_HEADER = b"\x00hub"
+COMPRESSION_METHODS = {"zlib": b"z", "lzma": b"x"}
+DEFAULT_COMPRESSION_THRESHOLD = 4096
+CHUNK_SIZE = 64 * 1024
+# Notes written per transaction by `notes import`
+IMPORT_BATCH = 1000
+
+
 def meta_data():
     return {
         "name": "notes",
-        "description": "Basic note management: list, new, recall, delete, edit.",
+        "description": "Basic note management: list, new, recall, delete, edit, migrate, export, import, compress.",
         "file_path": __file__,
     }
 
 
+def _encode_body(body, compression):
+    """Encode a note body for storage, compressed if the data directory asks for it
+    (`compression` is the "compression" setting of its config) and the body is large enough."""
+    return _EncodingReader(io.BytesIO(body.encode("utf-8")), compression).read()
+
+
+def _decode_body(data):
+    """Decode a stored note body, decompressing it if needed."""
+    if data.startswith(COMPRESSED_HEADER):
+        with _open_body(io.BytesIO(data)) as body:
+            data = body.read()
+    return data.decode("utf-8")
+
+
+def _open_body(raw):
+    """Wrap a binary stream positioned at the start of a stored body so that reading it
+    yields the note's UTF-8 bytes, decompressing on the fly if the body is compressed."""
+    header = raw.read(len(COMPRESSED_HEADER) + 1)
+    if header[:len(COMPRESSED_HEADER)] == COMPRESSED_HEADER:
+        for method, code in COMPRESSION_METHODS.items():
+            if header[len(COMPRESSED_HEADER):] == code:
+                return _DecompressingReader(raw, method)
+    raw.seek(0)
+    return raw
+
+
+class _DecompressingReader:
+    """Read-only file over a compressed body, decompressing one chunk at a time so
+    recalling a large note never holds all of it in memory."""
+
+    def __init__(self, raw, method):
+        self._raw = raw
+        self._zlib = method == "zlib"
+        if self._zlib:
+            import zlib
+            self._decompressor = zlib.decompressobj()
+        else:
+            import lzma
+            self._decompressor = lzma.LZMADecompressor()
+        self._pending = b""
+        self._eof = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(CHUNK_SIZE), b""))
+        while not self._eof:
+            if self._zlib:
+                data = self._pending or self._raw.read(CHUNK_SIZE)
+                if not data:
+                    self._eof = True
+                    return self._decompressor.flush()
+                out = self._decompressor.decompress(data, size)
+                self._pending = self._decompressor.unconsumed_tail
+            else:
+                if self._decompressor.eof:
+                    break
+                data = self._raw.read(CHUNK_SIZE) if self._decompressor.needs_input else b""
+                if not data and self._decompressor.needs_input:
+                    raise EOFError("Compressed note is truncated.")
+                out = self._decompressor.decompress(data, size)
+            if out:
+                return out
+        self._eof = True
+        return b""
+
+    def close(self):
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _EncodingReader:
+    """Read-only file yielding the stored form of the UTF-8 body read from `raw`, compressed
+    one chunk at a time, so rewriting a large note never holds all of it in memory."""
+
+    def __init__(self, raw, compression):
+        self._raw = raw
+        self._compressor = None
+        method = (compression or {}).get("method")
+        if method not in COMPRESSION_METHODS:
+            self._pending = b""
+            return
+        # Whether the body reaches the threshold decides if it is compressed at all
+        threshold = compression.get("threshold", DEFAULT_COMPRESSION_THRESHOLD)
+        head = b""
+        while len(head) < threshold:
+            data = raw.read(max(threshold - len(head), CHUNK_SIZE))
+            if not data:
+                break
+            head += data
+        if len(head) < threshold:
+            self._pending = head
+            return
+        if method == "zlib":
+            import zlib
+            self._compressor = zlib.compressobj()
+        else:
+            import lzma
+            self._compressor = lzma.LZMACompressor()
+        self._pending = COMPRESSED_HEADER + COMPRESSION_METHODS[method] + self._compressor.compress(head)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(CHUNK_SIZE), b""))
+        while len(self._pending) < size and self._raw is not None:
+            data = self._raw.read(CHUNK_SIZE)
+            if self._compressor is None:
+                self._pending += data
+            elif data:
+                self._pending += self._compressor.compress(data)
+            else:
+                self._pending += self._compressor.flush()
+            if not data:
+                self._raw = None
+        out, self._pending = self._pending[:size], self._pending[size:]
+        return out
+
+
+class _FileStore:
+    """One file per note directly in the data directory."""
+    backend = "files"
+
+    def __init__(self, data_dir, atomic_write):
+        self.data_dir = data_dir
+        self._atomic_write = atomic_write
+        # The "compression" setting of the data directory, see _open_store()
+        self.compression = None
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def names(self):
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if not entry.name.startswith(RESERVED_PREFIX) and entry.is_file():
+                    yield entry.name
+
+    def entries(self):
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if not entry.name.startswith(RESERVED_PREFIX) and entry.is_file():
+                    yield entry.name, entry.stat().st_mtime_ns
+
+    def mtime(self, name):
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def stamp(self):
+        # Creating, renaming or deleting a note changes the directory's modification time
+        return str(os.stat(self.data_dir).st_mtime_ns)
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def size(self, name):
+        try:
+            return os.stat(self._path(name)).st_size
+        except FileNotFoundError:
+            return None
+
+    def compressed(self, name):
+        try:
+            with open(self._path(name), "rb") as file:
+                return file.read(len(COMPRESSED_HEADER)) == COMPRESSED_HEADER
+        except FileNotFoundError:
+            return False
+
+    def read(self, name):
+        try:
+            with open(self._path(name), "rb") as file:
+                return _decode_body(file.read())
+        except FileNotFoundError:
+            return None
+
+    def open(self, name):
+        try:
+            return _open_body(open(self._path(name), "rb"))
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, body, durable=True):
+        # Written to a temporary file and renamed over the note, so a crash never
+        # leaves a missing or truncated note
+        self._atomic_write(self._path(name), _encode_body(body, self.compression), durable)
+
+    def write_many(self, items):
+        count = 0
+        for name, body in items:
+            self.write(name, body, durable=False)
+            count += 1
+        return count
+
+    def rewrite(self, name):
+        """Store a note again with the current compression setting, a chunk at a time."""
+        body = self.open(name)
+        if body is None:
+            return False
+        with body:
+            self._atomic_write(self._path(name), _EncodingReader(body, self.compression), False)
+        return True
+
+    def append(self, name, text):
+        """Append to a note without rewriting it, starting a new line if needed.
+        Compressed notes are rewritten instead."""
+        if self.compressed(name):
+            body = self.read(name)
+            if body and not body.endswith("\n"):
+                text = "\n" + text
+            self.write(name, body + text)
+            return text
+        with open(self._path(name), "a+b") as file:
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    text = "\n" + text
+            file.write(text.encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        return text
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def close(self):
+        pass
+
+
+class _SqliteDatabase:
+    """A SQLite file, with one connection per thread so commands run concurrently
+    by `hub run --jobs` can share it."""
+    schema = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.conn  # create the schema now
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3  # only paid for by data directories that use SQLite
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _SqliteStore(_SqliteDatabase):
+    """All notes in one SQLite database, indexed by name."""
+    backend = "sqlite"
+    filename = RESERVED_PREFIX + "notes.db"
+    schema = "CREATE TABLE IF NOT EXISTS notes (name TEXT PRIMARY KEY, body BLOB NOT NULL, mtime INTEGER NOT NULL);"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.compression = None
+        super().__init__(os.path.join(data_dir, self.filename))
+
+    def names(self):
+        for (name,) in self.conn.execute("SELECT name FROM notes ORDER BY name"):
+            yield name
+
+    def entries(self):
+        yield from self.conn.execute("SELECT name, mtime FROM notes")
+
+    def mtime(self, name):
+        row = self.conn.execute("SELECT mtime FROM notes WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def stamp(self):
+        # Every change goes through hub, so the index never needs reconciling
+        return self.backend
+
+    def exists(self, name):
+        return self.conn.execute("SELECT 1 FROM notes WHERE name = ?", (name,)).fetchone() is not None
+
+    def size(self, name):
+        row = self.conn.execute("SELECT length(body) FROM notes WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def compressed(self, name):
+        row = self.conn.execute("SELECT rowid FROM notes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return False
+        # Blob I/O reads just the header; substr() would load the whole body
+        with self.conn.blobopen("notes", "body", row[0], readonly=True) as blob:
+            return blob.read(len(COMPRESSED_HEADER)) == COMPRESSED_HEADER
+
+    def read(self, name):
+        row = self.conn.execute("SELECT body FROM notes WHERE name = ?", (name,)).fetchone()
+        return None if row is None else _decode_body(bytes(row[0]))
+
+    def open(self, name):
+        row = self.conn.execute("SELECT rowid FROM notes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        # Incremental blob I/O: the body is read in chunks rather than loaded at once
+        return _open_body(self.conn.blobopen("notes", "body", row[0], readonly=True))
+
+    def write(self, name, body):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO notes (name, body, mtime) VALUES (?, ?, ?)",
+            (name, _encode_body(body, self.compression), time.time_ns()),
+        )
+
+    def write_many(self, items):
+        now = time.time_ns()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.executemany(
+                "INSERT OR REPLACE INTO notes (name, body, mtime) VALUES (?, ?, ?)",
+                ((name, _encode_body(body, self.compression), now) for name, body in items),
+            )
+        return cursor.rowcount
+
+    def rewrite(self, name):
+        """Store a note again with the current compression setting, a chunk at a time."""
+        import shutil
+        import tempfile
+        body = self.open(name)
+        if body is None:
+            return False
+        # Staged in a temporary file: the new size must be known to allocate the blob, and
+        # the old blob cannot be read once its row is replaced
+        with tempfile.TemporaryFile() as staged:
+            with body:
+                shutil.copyfileobj(_EncodingReader(body, self.compression), staged, CHUNK_SIZE)
+            size = staged.tell()
+            staged.seek(0)
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                # SQLite still builds the row in memory, as mtime follows body in the record,
+                # but this costs less than binding the stored bytes
+                rowid = self.conn.execute(
+                    "INSERT OR REPLACE INTO notes (name, body, mtime) VALUES (?, zeroblob(?), ?)",
+                    (name, size, time.time_ns()),
+                ).lastrowid
+                if size:
+                    with self.conn.blobopen("notes", "body", rowid) as blob:
+                        for chunk in iter(lambda: staged.read(CHUNK_SIZE), b""):
+                            blob.write(chunk)
+        return True
+
+    def append(self, name, text):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT substr(body, -1, 1) FROM notes WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                self.write(name, text)
+                return text
+            if self.compressed(name):
+                body = self.read(name)
+                if body and not body.endswith("\n"):
+                    text = "\n" + text
+                self.write(name, body + text)
+                return text
+            if row[0] and bytes(row[0]) != b"\n":
+                text = "\n" + text
+            self.conn.execute(
+                "UPDATE notes SET body = CAST(body || ? AS BLOB), mtime = ? WHERE name = ?",
+                (text.encode("utf-8"), time.time_ns(), name),
+            )
+        return text
+
+    def delete(self, name):
+        return self.conn.execute("DELETE FROM notes WHERE name = ?", (name,)).rowcount > 0
+
+
+class _SearchIndex(_SqliteDatabase):
+    """Inverted index of note names and bodies, ranked with BM25."""
+    schema = """
+        CREATE TABLE IF NOT EXISTS docs (name TEXT PRIMARY KEY, mtime INTEGER NOT NULL, length INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL, name TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, name)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS postings_name ON postings (name);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _get_stamp(self):
+        return self._get_meta("stamp")
+
+    def _set_stamp(self, stamp):
+        self._set_meta("stamp", stamp)
+
+    def _remove(self, name):
+        self.conn.execute("DELETE FROM postings WHERE name = ?", (name,))
+        self.conn.execute("DELETE FROM docs WHERE name = ?", (name,))
+
+    def _extend(self, name, text, mtime):
+        counts = {}
+        for term in TOKEN_RE.findall(text.lower()):
+            counts[term] = counts.get(term, 0) + 1
+        self.conn.execute(
+            "UPDATE docs SET mtime = ?, length = length + ? WHERE name = ?",
+            (mtime, sum(counts.values()), name),
+        )
+        self.conn.executemany(
+            "INSERT INTO postings (term, name, tf) VALUES (?, ?, ?)"
+            " ON CONFLICT (term, name) DO UPDATE SET tf = tf + excluded.tf",
+            ((term, name, tf) for term, tf in counts.items()),
+        )
+
+    def _add(self, name, body, mtime, replace=True):
+        if replace:
+            self._remove(name)
+        counts = {}
+        for term in TOKEN_RE.findall(f"{name} {body}".lower()):
+            counts[term] = counts.get(term, 0) + 1
+        self.conn.execute(
+            "INSERT INTO docs (name, mtime, length) VALUES (?, ?, ?)",
+            (name, mtime, sum(counts.values())),
+        )
+        self.conn.executemany(
+            "INSERT INTO postings (term, name, tf) VALUES (?, ?, ?)",
+            ((term, name, tf) for term, tf in counts.items()),
+        )
+
+    def mtime(self, name):
+        row = self.conn.execute("SELECT mtime FROM docs WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def update_many(self, items, before=None, after=None):
+        """Index many notes written by hub, given (name, body, mtime) items, in one transaction."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for name, body, mtime in items:
+                self._add(name, body, mtime)
+            if before is not None and self._get_stamp() == before:
+                self._set_stamp(after)
+
+    def update(self, name, body, mtime, before=None, after=None):
+        """Index a note written by hub. If the index was current before the write
+        (stamp `before`), it is still current afterwards (stamp `after`)."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            if body is None:
+                self._remove(name)
+            else:
+                self._add(name, body, mtime)
+            if before is not None and self._get_stamp() == before:
+                self._set_stamp(after)
+
+    def touch_many(self, items, before=None, after=None):
+        """Record new modification times, given (name, mtime) items, for notes whose text
+        did not change, such as notes rewritten by `notes compress`."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("UPDATE docs SET mtime = ? WHERE name = ?", ((mtime, name) for name, mtime in items))
+            if before is not None and self._get_stamp() == before:
+                self._set_stamp(after)
+
+    def extend(self, name, text, mtime, before=None, after=None):
+        """Index text appended to an already indexed note, without reading the note."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self._extend(name, text, mtime)
+            if before is not None and self._get_stamp() == before:
+                self._set_stamp(after)
+
+    def reconcile(self, store, full=False):
+        """Re-index notes whose modification time differs from the indexed one. Skipped
+        while the store's stamp is unchanged, unless the last scan is RESCAN_INTERVAL old."""
+        stamp = store.stamp()
+        now = time.time_ns()
+        if not full and self._get_stamp() == stamp:
+            scanned = self._get_meta("scanned")
+            if scanned is not None and now - int(scanned) < RESCAN_INTERVAL * 1_000_000_000:
+                return 0
+        known = dict(self.conn.execute("SELECT name, mtime FROM docs"))
+        changed = 0
+        with self.conn:
+            self.conn.execute("BEGIN")
+            if full:
+                self.conn.execute("DELETE FROM postings")
+                self.conn.execute("DELETE FROM docs")
+                known = {}
+            for name, mtime in store.entries():
+                if known.pop(name, None) != mtime:
+                    body = store.read(name)
+                    if body is not None:
+                        self._add(name, body, mtime, replace=not full)
+                        changed += 1
+            for name in known:
+                self._remove(name)
+                changed += 1
+            self._set_stamp(stamp)
+            self._set_meta("scanned", str(now))
+        return changed
+
+    def search(self, terms, limit):
+        """Return (name, score) pairs of notes containing every term, best first."""
+        total, average = self.conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+        if not total:
+            return []
+        k1, b = 1.2, 0.75
+        scores = {}
+        matched = {}
+        for term in terms:
+            rows = self.conn.execute(
+                "SELECT postings.name, postings.tf, docs.length FROM postings"
+                " JOIN docs ON docs.name = postings.name WHERE postings.term = ?",
+                (term,),
+            ).fetchall()
+            if not rows:
+                return []
+            idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+            for name, tf, length in rows:
+                norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+                scores[name] = scores.get(name, 0.0) + idf * norm
+                matched[name] = matched.get(name, 0) + 1
+        hits = [(name, score) for name, score in scores.items() if matched[name] == len(terms)]
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits[:limit]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM meta")
+
+
+def _read_config(data_dir):
+    try:
+        with open(os.path.join(data_dir, CONFIG_FILE), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_config(data_dir, config):
+    with open(os.path.join(data_dir, CONFIG_FILE), "w") as file:
+        json.dump(config, file, indent=4)
+
+
+def _make_store(api, data_dir, backend, compression=None):
+    key = (data_dir, backend)
+    if key not in _STORES:
+        if backend == "sqlite":
+            _STORES[key] = _SqliteStore(data_dir)
+        else:
+            _STORES[key] = _FileStore(data_dir, api["atomic_write"])
+        _STORES[key].index_path = _index_path(api, data_dir)
+    _STORES[key].compression = compression
+    return _STORES[key]
+
+
+def _index_path(api, data_dir):
+    """The search index of a data directory lives in the cache directory, keyed by its path."""
+    index_dir = os.path.join(api["get_cache_dir"](), "notes-index")
+    os.makedirs(index_dir, exist_ok=True)
+    # Indexes used to live in the data directory itself
+    for suffix in ("", "-wal", "-shm"):
+        legacy = os.path.join(data_dir, RESERVED_PREFIX + "search.db" + suffix)
+        if os.path.exists(legacy):
+            os.remove(legacy)
+    key = hashlib.sha256(os.path.realpath(data_dir).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(index_dir, key + ".db")
+
+
+def _open_index(store):
+    if store.index_path not in _INDEXES:
+        _INDEXES[store.index_path] = _SearchIndex(store.index_path)
+    return _INDEXES[store.index_path]
+
+
+def _open_store(api):
+    data_dir = api["get_data_local_dir"]()
+    config = _read_config(data_dir)
+    return _make_store(api, data_dir, config.get("backend", "files"), config.get("compression"))
+
+
+def _valid_name(name):
+    # Every note must be storable as a file directly in the data directory, whichever
+    # backend holds it now, so that `migrate files` never fails half-way
+    return (
+        bool(name) and not name.startswith(RESERVED_PREFIX)
+        and name not in (".", "..") and "/" not in name and os.sep not in name
+    )
+
+
 def help(api, args):
     return [
         "Usage: notes <command> [args]",
@@ -21,29 +677,49 @@ def help(api, args):
         "  recall <name>   - Read a note",
         "  delete <name>   - Delete a note",
         "  edit <name> <body> - Edit (overwrite) a note",
+        "  append <name> <text> - Add a line to the end of a note, creating it if needed",
+        "  search [--limit N] <terms> - Find notes containing all terms, best match first",
+        "  reindex         - Rebuild the search index (after bulk edits made outside hub)",
+        "  migrate <files|sqlite> - Move all notes to another storage backend",
+        "  export [--format jsonl|tar] [--output FILE] [patterns] - Write notes (optionally only",
+        "                  those matching glob patterns) to FILE or stdout",
+        "  import [--format jsonl|tar] [--replace] [FILE] - Add the notes of an export from FILE",
+        "                  or stdin, skipping existing notes unless --replace is given",
+        "  compress <zlib|lzma|off> [--threshold BYTES] - Store notes larger than BYTES",
+        f"                  (default {DEFAULT_COMPRESSION_THRESHOLD}) compressed, and recompress existing notes",
     ]
 
 
 def recall(api, args):
     if not args:
         return "Please provide the name of the note to recall."
-    data_dir = api["get_data_local_dir"]()
-    note_path = os.path.join(data_dir, args[0])
-    if os.path.exists(note_path):
-        with open(note_path, "r") as file:
-            content = file.read()
-            return content
-    else:
+    # Returned as a file-like object so main streams it instead of holding it in memory
+    note = _open_store(api).open(args[0])
+    if note is None:
+        return f"Note '{args[0]}' does not exist."
+    return note
+
+
+def _recall_text(api, args):
+    """`recall` for other plugins, which expect the note's text."""
+    if not args:
+        return "Please provide the name of the note to recall."
+    content = _open_store(api).read(args[0])
+    if content is None:
         return f"Note '{args[0]}' does not exist."
+    return content
 
 
 def delete(api, args):
     if not args:
         return "Please provide the name of the note to delete."
-    data_dir = api["get_data_local_dir"]()
-    note_path = os.path.join(data_dir, args[0])
-    if os.path.exists(note_path):
-        os.remove(note_path)
+    store = _open_store(api)
+    # The files backend cannot hold such names, and must not delete outside its notes
+    if store.backend == "files" and not _valid_name(args[0]):
+        return f"Note '{args[0]}' does not exist."
+    before = store.stamp()
+    if store.delete(args[0]):
+        _open_index(store).update(args[0], None, None, before, store.stamp())
         return f"Note '{args[0]}' deleted."
     else:
         return f"Note '{args[0]}' does not exist."
@@ -52,35 +728,350 @@ def delete(api, args):
 def new(api, args):
     if len(args) < 2:
         return "Please provide the name and content of the note."
-    data_dir = api["get_data_local_dir"]()
-    with open(os.path.join(data_dir, args[0]), "w") as file:
-        file.write(" ".join(args[1:]))
+    if not _valid_name(args[0]):
+        return f"'{args[0]}' cannot be used as a note name."
+    _write_note(_open_store(api), args[0], " ".join(args[1:]))
     return f"Note '{args[0]}' created."
 
 
+def _write_note(store, name, body):
+    before = store.stamp()
+    store.write(name, body)
+    _open_index(store).update(name, body, store.mtime(name), before, store.stamp())
+
+
 def list(api, args):
     data_dir = api["get_data_local_dir"]()
     if not os.path.exists(data_dir):
         return "No data directory found."
-    notes = os.listdir(data_dir)
-    return notes
+    # A generator, so main prints names as the directory is scanned
+    return _open_store(api).names()
 
 
 def edit(api, args):
-    if not args:
-        return "Please provide the name of the note to edit."
-    # Delete the old note and create a new one
-    out = []
-    d = delete(api, [args[0]])
-    if d:
-        out.append(d)
-    n = new(api, args)
-    if n:
-        out.append(n)
-    return out
+    if len(args) < 2:
+        return "Please provide the name and new content of the note."
+    if not _valid_name(args[0]):
+        return f"'{args[0]}' cannot be used as a note name."
+    store = _open_store(api)
+    existed = store.exists(args[0])
+    # Replaced atomically: the note is never missing or half-written
+    _write_note(store, args[0], " ".join(args[1:]))
+    return f"Note '{args[0]}' {'updated' if existed else 'created'}."
+
+
+def append(api, args):
+    if len(args) < 2:
+        return "Please provide the name of the note and the text to append."
+    if not _valid_name(args[0]):
+        return f"'{args[0]}' cannot be used as a note name."
+    store = _open_store(api)
+    index = _open_index(store)
+    before = store.stamp()
+    text = store.append(args[0], " ".join(args[1:]))
+    if index.mtime(args[0]) is None:
+        index.update(args[0], store.read(args[0]), store.mtime(args[0]), before, store.stamp())
+    else:
+        index.extend(args[0], text, store.mtime(args[0]), before, store.stamp())
+    return f"Appended to note '{args[0]}'."
+
+
+def search(api, args):
+    limit = 20
+    if len(args) >= 2 and args[0] == "--limit":
+        if not args[1].isdigit():
+            return "The search limit must be a number."
+        limit = int(args[1])
+        args = args[2:]
+    terms = sorted(set(TOKEN_RE.findall(" ".join(args).lower())))
+    if not terms:
+        return "Please provide the terms to search for."
+    store = _open_store(api)
+    index = _open_index(store)
+    index.reconcile(store)
+    hits = index.search(terms, limit)
+    # Notes edited in place outside hub leave the directory stamp alone, so re-check the hits
+    stale = [name for name, _ in hits if store.mtime(name) != index.mtime(name)]
+    if stale:
+        for name in stale:
+            index.update(name, store.read(name), store.mtime(name))
+        hits = index.search(terms, limit)
+    if not hits:
+        return f"No notes match '{' '.join(args)}'."
+    return [name for name, _ in hits]
+
+
+def reindex(api, args):
+    store = _open_store(api)
+    count = _open_index(store).reconcile(store, full=True)
+    return f"Indexed {count} note(s)."
+
+
+def migrate(api, args):
+    if not args or args[0] not in BACKENDS:
+        return f"Usage: notes migrate <{'|'.join(BACKENDS)}>"
+    data_dir = api["get_data_local_dir"]()
+    config = _read_config(data_dir)
+    source = _make_store(api, data_dir, config.get("backend", "files"), config.get("compression"))
+    if source.backend == args[0]:
+        return f"Notes are already stored with the {args[0]} backend."
+    target = _make_store(api, data_dir, args[0], config.get("compression"))
+
+    names = [name for name in source.names()]
+    # Notes stored before names were checked; moving them would fail part-way
+    invalid = [name for name in names if not _valid_name(name)]
+    if invalid:
+        shown = ", ".join(repr(name) for name in invalid[:10])
+        more = f" and {len(invalid) - 10} more" if len(invalid) > 10 else ""
+        return (
+            f"Cannot migrate: {len(invalid)} note name(s) cannot be stored as files: {shown}{more}. "
+            "Recall and delete them, or save them under other names, then migrate again."
+        )
+    try:
+        target.write_many((name, source.read(name)) for name in names)
+    except OSError as e:
+        return f"Migration failed, the notes stay in the {source.backend} backend: {e}"
+    config["backend"] = target.backend
+    _write_config(data_dir, config)
+    # Modification times differ between backends; rebuild the index on the next search
+    _open_index(target).clear()
+
+    # Only remove the old copies once the new backend holds every note
+    for name in names:
+        source.delete(name)
+    if isinstance(source, _SqliteStore):
+        source.close()
+        del _STORES[(data_dir, source.backend)]
+        for suffix in ("", "-wal", "-shm"):
+            path = os.path.join(data_dir, _SqliteStore.filename + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+    return f"Migrated {len(names)} note(s) to the {target.backend} backend."
+
+
+def _parse_transfer_args(args, flags):
+    """Split `--format`, `--output` and the given boolean flags off export/import arguments.
+    Returns (options, remaining arguments), or (None, error message)."""
+    options = {"format": None, "output": None}
+    for flag in flags:
+        options[flag] = False
+    rest = []
+    args = iter(args)
+    for arg in args:
+        if arg in ("--format", "--output") and arg[2:] in options:
+            value = next(args, None)
+            if value is None:
+                return None, f"{arg} needs a value."
+            options[arg[2:]] = value
+        elif arg.startswith("--") and arg[2:] in flags:
+            options[arg[2:]] = True
+        else:
+            rest.append(arg)
+    if options["format"] is not None and options["format"] not in EXPORT_FORMATS:
+        return None, f"Unknown format '{options['format']}', use {' or '.join(EXPORT_FORMATS)}."
+    return options, rest
+
+
+def _guess_format(path):
+    if path and path.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".tar.bz2")):
+        return "tar"
+    return "jsonl"
+
+
+def _exported_notes(store, patterns):
+    """Yield (name, body, mtime) for every note matching one of the patterns, one at a time."""
+    for name in store.names():
+        if patterns and not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            continue
+        body = store.read(name)
+        if body is not None:
+            yield name, body, store.mtime(name)
+
+
+def _jsonl_lines(notes):
+    for name, body, mtime in notes:
+        yield json.dumps({"name": name, "body": body, "mtime": mtime}, ensure_ascii=False)
+
+
+def _write_tar(file, notes, compression=""):
+    """Write notes to a binary file as a streamed tar archive; returns the number written."""
+    import tarfile  # only paid for by tar exports and imports
+    count = 0
+    with tarfile.open(fileobj=file, mode="w|" + compression) as archive:
+        for name, body, mtime in notes:
+            data = body.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = (mtime or time.time_ns()) // 1_000_000_000
+            info.mode = 0o644
+            archive.addfile(info, io.BytesIO(data))
+            count += 1
+    return count
+
+
+def export(api, args):
+    options, patterns = _parse_transfer_args(args, ())
+    if options is None:
+        return patterns
+    output = None if options["output"] in (None, "-") else options["output"]
+    fmt = options["format"] or _guess_format(output)
+    store = _open_store(api)
+    notes = _exported_notes(store, patterns)
+
+    if output is None:
+        if fmt == "jsonl":
+            # A generator, so main prints each note as soon as it is read
+            return _jsonl_lines(notes)
+        if not hasattr(sys.stdout, "buffer"):
+            return "A tar export cannot be written to this output; use --output FILE."
+        sys.stdout.flush()
+        _write_tar(sys.stdout.buffer, notes)
+        sys.stdout.buffer.flush()
+        return None
+
+    temp_path = f"{output}.{os.getpid()}.tmp"
+    try:
+        if fmt == "tar":
+            compression = {".gz": "gz", ".tgz": "gz", ".xz": "xz", ".bz2": "bz2"}.get(os.path.splitext(output)[1], "")
+            with open(temp_path, "wb") as file:
+                count = _write_tar(file, notes, compression)
+        else:
+            count = 0
+            with open(temp_path, "w", encoding="utf-8") as file:
+                for line in _jsonl_lines(notes):
+                    file.write(line + "\n")
+                    count += 1
+        os.replace(temp_path, output)
+    except OSError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return f"Cannot export to '{output}': {e}"
+    return f"Exported {count} note(s) to '{output}'."
+
+
+def _read_jsonl(file):
+    """Yield (name, body) from JSON Lines, or (None, None) for lines that are not notes."""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            name, body = record["name"], record["body"]
+        except (ValueError, KeyError, TypeError):
+            yield None, None
+            continue
+        if isinstance(name, str) and isinstance(body, str):
+            yield name, body
+        else:
+            yield None, None
+
+
+def _read_tar(file):
+    """Yield (name, body) for the regular files of a streamed, possibly compressed, tar archive."""
+    import tarfile
+    with tarfile.open(fileobj=file, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            content = archive.extractfile(member)
+            try:
+                yield member.name, content.read().decode("utf-8")
+            except UnicodeDecodeError:
+                yield None, None
+
+
+def _import_batches(store, records, replace, skipped):
+    """Group valid records into batches of IMPORT_BATCH; skipped[0] counts the rest."""
+    batch = []
+    for name, body in records:
+        if name is None or not _valid_name(name) or (not replace and store.exists(name)):
+            skipped[0] += 1
+            continue
+        batch.append((name, body))
+        if len(batch) >= IMPORT_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_(api, args):
+    options, rest = _parse_transfer_args(args, ("replace",))
+    if options is None:
+        return rest
+    source = rest[0] if rest and rest[0] != "-" else None
+    fmt = options["format"] or _guess_format(source)
+    try:
+        if source is None:
+            file = sys.stdin.buffer if fmt == "tar" else sys.stdin
+        else:
+            file = open(source, "rb" if fmt == "tar" else "r", encoding=None if fmt == "tar" else "utf-8")
+    except OSError as e:
+        return f"Cannot read '{source}': {e}"
+
+    store = _open_store(api)
+    index = _open_index(store)
+    imported = 0
+    skipped = [0]
+    try:
+        records = _read_tar(file) if fmt == "tar" else _read_jsonl(file)
+        for batch in _import_batches(store, records, options["replace"], skipped):
+            before = store.stamp()
+            imported += store.write_many(batch)
+            index.update_many(((name, body, store.mtime(name)) for name, body in batch), before, store.stamp())
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        return f"Import stopped after {imported} note(s): {e}"
+    finally:
+        if source is not None:
+            file.close()
+    message = f"Imported {imported} note(s)."
+    if skipped[0]:
+        message += f" Skipped {skipped[0]} existing or invalid note(s)."
+    return message
+
+
+def compress(api, args):
+    methods = "|".join(COMPRESSION_METHODS)
+    if not args or args[0] not in (*COMPRESSION_METHODS, "off"):
+        return f"Usage: notes compress <{methods}|off> [--threshold BYTES]"
+    threshold = DEFAULT_COMPRESSION_THRESHOLD
+    if len(args) >= 3 and args[1] == "--threshold":
+        if not args[2].isdigit():
+            return "The compression threshold must be a number of bytes."
+        threshold = int(args[2])
+    data_dir = api["get_data_local_dir"]()
+    config = _read_config(data_dir)
+    if args[0] == "off":
+        config.pop("compression", None)
+    else:
+        config["compression"] = {"method": args[0], "threshold": threshold}
+    _write_config(data_dir, config)
+
+    # Rewrite the notes whose stored form changes one at a time, streaming each; their text
+    # is unchanged, so the index only records the new modification times, per batch
+    store = _open_store(api)
+    index = _open_index(store)
+    names = [name for name in store.names()]
+    rewritten = 0
+    for start in range(0, len(names), IMPORT_BATCH):
+        batch = []
+        before = store.stamp()
+        for name in names[start:start + IMPORT_BATCH]:
+            # Notes already compressed, possibly with another method, are rewritten too
+            if store.compressed(name) or (store.compression and (store.size(name) or 0) >= threshold):
+                if store.rewrite(name):
+                    batch.append(name)
+        if batch:
+            rewritten += len(batch)
+            index.touch_many(((name, store.mtime(name)) for name in batch), before, store.stamp())
+    if args[0] == "off":
+        return f"Compression disabled; {rewritten} note(s) decompressed."
+    return f"Notes of {threshold} bytes or more are now stored with {args[0]}; {rewritten} note(s) rewritten."
+
+
 def main(api, args):
     return help(api, args)
 def hub_add_api():
     return {
-        "recall note": recall,
-    }
\ No newline at end of file
+        "recall note": _recall_text,
+    }
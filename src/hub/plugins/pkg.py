@@ -1,5 +1,4 @@
 """Plugin package management."""
-import importlib.util
 import os
 import shutil
 import requests
@@ -10,6 +9,9 @@ VMINOR = 4
 VPATCH = 0
 ID = "com.flench04.pkg"
 
+INSTALL_WORKERS = 8
+LOCK_FILE = "lock.json"
+
 def meta_data():
     return {
         "name": "pkg",
@@ -19,7 +21,10 @@ def meta_data():
 
 
 def help(api, args):
-    return "Usage: pkg add <path> | pkg remove <name> | pkg export <name> | pkg info [names...]"
+    return (
+        "Usage: pkg add <path> | pkg remove <name> | pkg export <name> | pkg info [names...]"
+        " | pkg install <name|url>... | pkg install --from <file>"
+    )
 
 
 def add(api, args):
@@ -64,7 +69,7 @@ def info(api, args):
     info_path = _resolve_plugin_path(config_dir, "info")
     if not info_path:
         return "Info plugin not found."
-    module = _load_module("info", info_path)
+    module = api["load_plugin"]("info", info_path)
     if module and hasattr(module, "main"):
         return module.main(api, args)
     else:
@@ -78,60 +83,156 @@ def _resolve_plugin_path(config_dir, name):
     return None
 
 
-def _load_module(name, plugin_path):
-    spec = importlib.util.spec_from_file_location(name, plugin_path)
-    if spec is None or spec.loader is None:
-        return None
-    module = importlib.util.module_from_spec(spec)  # type: ignore
-    spec.loader.exec_module(module)  # type: ignore
-    return module
 def install(api, args):
     '''
-    Install a plugin from a given url or the index.json file. Returns a status message.
+    Install plugins from given urls or by name from the index.json file. Returns a status
+    message, or a list of them when several plugins are installed.
+    Usage: install <name|url>... | install --from <file> [<name|url>...]
+    Plugins listed in an index entry's "requires" are installed too. Downloads run
+    concurrently, and the resolved URLs and hashes are recorded in pkg/lock.json.
     '''
-    if not args:
+    sources = list(args)
+    if len(sources) >= 2 and sources[0] == "--from":
+        try:
+            sources = _read_requirements(sources[1]) + sources[2:]
+        except OSError as e:
+            return f"Cannot read '{sources[1]}': {e}"
+    if not sources:
         return "Please provide the plugin name or URL to install."
-    source = args[0]
     config_dir = api["get_config_dir"]()
     plugins_dir = os.path.join(config_dir, "plugins")
-    # Install from direct URL
-    if source.startswith("http://") or source.startswith("https://"):
-        response = requests.get(source)
-        if response.status_code != 200:
-            return f"Failed to download plugin from {source}."
-        plugin_name = source.split("/")[-1]
-        os.makedirs(plugins_dir, exist_ok=True)
-        destination_path = os.path.join(plugins_dir, plugin_name)
-        with open(destination_path, "wb") as f:
-            f.write(response.content)
-        return f"Installed plugin from {source} to {destination_path}"
-
-    # Install by name from the index.json file
-    index_path = os.path.join(config_dir, "pkg", "index.json")
-    if not os.path.exists(index_path):
-        os.makedirs(os.path.dirname(index_path), exist_ok=True)
-        default_index = {
-            "hi": {
-                "url": "https://raw.githubusercontent.com/Fleench/mem-note/refs/heads/main/src/hub/plugins/hi.py"
-            }
-        }
-        with open(index_path, "w") as f:
-            json.dump(default_index, f)
-        return "Default index file added."
 
-    with open(index_path, "r") as f:
-        index = json.load(f)
+    index = {}
+    if not all(_is_url(source) for source in sources):
+        # Install by name from the index.json file
+        index_path = os.path.join(config_dir, "pkg", "index.json")
+        if not os.path.exists(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            default_index = {
+                "hi": {
+                    "url": "https://raw.githubusercontent.com/Fleench/mem-note/refs/heads/main/src/hub/plugins/hi.py"
+                }
+            }
+            with open(index_path, "w") as f:
+                json.dump(default_index, f)
+            return "Default index file added."
 
-    if source not in index:
-        return f"Plugin '{source}' not found in index."
+        with open(index_path, "r") as f:
+            index = json.load(f)
 
-    plugin_url = index[source]["url"]
-    response = requests.get(plugin_url)
-    if response.status_code != 200:
-        return f"Failed to download plugin from {plugin_url}."
+    plan, missing = _resolve_install(sources, index)
+    if missing:
+        return "\n".join(f"Plugin '{name}' not found in index." for name in missing)
 
     os.makedirs(plugins_dir, exist_ok=True)
-    destination_path = os.path.join(plugins_dir, f"{source}.py")
-    with open(destination_path, "wb") as f:
-        f.write(response.content)
-    return f"Installed plugin '{source}' from {plugin_url} to {destination_path}"
+    from concurrent.futures import ThreadPoolExecutor
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=INSTALL_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(min(INSTALL_WORKERS, len(plan))) as executor:
+            results = list(executor.map(
+                lambda item: _download(api, item[2], os.path.join(plugins_dir, item[1]), item[3], session),
+                plan,
+            ))
+
+    out = []
+    locked = {}
+    for (name, filename, url, _), (digest, error) in zip(plan, results):
+        if error:
+            out.append(error)
+            continue
+        locked[name] = {"url": url, "sha256": digest}
+        destination_path = os.path.join(plugins_dir, filename)
+        if _is_url(name):
+            out.append(f"Installed plugin from {url} to {destination_path}")
+        else:
+            out.append(f"Installed plugin '{name}' from {url} to {destination_path}")
+    if locked:
+        os.makedirs(os.path.join(config_dir, "pkg"), exist_ok=True)
+        lock_path = os.path.join(config_dir, "pkg", LOCK_FILE)
+        lock = {}
+        if os.path.exists(lock_path):
+            with open(lock_path, "r") as f:
+                lock = json.load(f)
+        lock.update(locked)
+        api["atomic_write"](lock_path, json.dumps(lock, indent=4, sort_keys=True))
+        # Index the new plugins now, so the next command does not have to
+        api["get_plugin_index"]()
+    if len(out) == 1:
+        return out[0]
+    out.append(f"Installed {len(locked)} of {len(plan)} plugin(s).")
+    return out
+
+
+def _is_url(source):
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def _read_requirements(path):
+    '''
+    Read plugin names or URLs from a requirements file: whitespace separated, with
+    "#" starting a comment.
+    '''
+    names = []
+    with open(path, "r") as f:
+        for line in f:
+            names.extend(line.split("#", 1)[0].split())
+    return names
+
+
+def _resolve_install(sources, index):
+    '''
+    Resolve plugins to install with their requirements, each plugin once, requirements
+    first. Returns (plan, missing names), the plan being (name, filename, url, sha256)
+    tuples; URL sources are keyed by the URL itself.
+    '''
+    plan = []
+    missing = []
+    seen = set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        if _is_url(name):
+            plan.append((name, name.split("/")[-1], name, None))
+            return
+        entry = index.get(name)
+        if not isinstance(entry, dict) or "url" not in entry:
+            missing.append(name)
+            return
+        requires = entry.get("requires", [])
+        for requirement in [requires] if isinstance(requires, str) else requires:
+            visit(requirement)
+        plan.append((name, f"{name}.py", entry["url"], entry.get("sha256")))
+
+    for source in sources:
+        visit(source)
+    return plan, missing
+
+
+def _download(api, url, destination_path, sha256=None, session=None):
+    '''
+    Download a plugin into place through hub's download cache, which streams, resumes and
+    verifies the payload. The plugin is only written over the destination, atomically,
+    once it compiles, so a bad download never leaves a broken plugin. Other payloads are
+    copied from the cache in chunks rather than read into memory.
+    Returns (sha256 of the installed file, None) on success, or (None, error message).
+    '''
+    try:
+        cached_path, digest = api["download"](url, sha256, session)
+    except OSError as e:
+        return None, str(e)
+    with open(cached_path, "rb") as f:
+        if not destination_path.endswith(".py"):
+            api["atomic_write"](destination_path, f)
+            return digest, None
+        # compile() needs the whole source
+        data = f.read()
+    try:
+        compile(data, destination_path, "exec")
+    except (SyntaxError, ValueError) as e:
+        return None, f"Downloaded plugin from {url} does not compile: {e}"
+    api["atomic_write"](destination_path, data)
+    return digest, None
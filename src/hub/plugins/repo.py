@@ -4,6 +4,7 @@ Plugin to manage repositories of plugins.
 import os
 import shutil
 import json
+import re
 import requests
 
 VMAJOR = 0
@@ -11,6 +12,19 @@ VMINOR = 4
 VPATCH = 0
 ID = "com.flench04.repo"
 
+# Concurrent downloads used by `repo update`
+UPDATE_WORKERS = 8
+
+# Which plugins each repo file provided at the last `repo build`
+BUILD_STATE_FILE = "build-state.json"
+BUILD_STATE_FORMAT = 1
+
+# Search index written next to pkg/index.json by `repo build`
+SEARCH_INDEX_FILE = "search.db"
+SEARCH_INDEX_FORMAT = 2
+SEARCH_LIMIT = 20
+TOKEN_RE = re.compile(r"\w+")
+
 def meta_data():
     return {
         "name": "repo",
@@ -40,13 +54,13 @@ def add(api, args):
     config_dir_self = _get_config_dir_self(config_dir)
     source = args[0]
     if args[0].startswith("http://") or args[0].startswith("https://"):
-        response = requests.get(source)
-        if response.status_code != 200:
-            return f"Failed to download plugin from {source}."
-        plugin_name = source.split("/")[-1]
-        destination_path = os.path.join(config_dir_self, response.url.split("/")[-1])
-        with open(destination_path, "wb") as f:
-            f.write(response.content)
+        try:
+            cached_path, _ = api["download"](source)
+        except OSError as e:
+            return f"Failed to download repo from {source}: {e}"
+        destination_path = os.path.join(config_dir_self, source.split("/")[-1])
+        with open(cached_path, "rb") as f:
+            api["atomic_write"](destination_path, f.read())
         return f"Installed repo from {source} to {destination_path}"
     else:
         destination_path = os.path.join(config_dir_self, source.split("/")[-1])
@@ -69,75 +83,313 @@ def remove(api, args):
 def update(api, args):
     '''
     Update plugin repositories. Returns list of status messages.
+    Repositories are fetched concurrently over one connection pool through hub's
+    download cache, which only downloads repos that changed since they were last
+    fetched; unchanged files are left untouched.
     '''
-    out = []
     config_dir = api["get_config_dir"]()
     config_dir_self = _get_config_dir_self(config_dir)
-    for filename in os.listdir(config_dir_self):
+    repos = []
+    for filename in sorted(os.listdir(config_dir_self)):
         if not filename.endswith(".json"):
             continue
         repo_path = os.path.join(config_dir_self, filename)
         with open(repo_path, "r") as f:
-            repo = json.load(f)
-            repo_url = repo["repo-info"]["url"]
-            response = requests.get(repo_url)
-            if response.status_code != 200:
-                out.append(f"Failed to update repo from {repo_url}.")
-                continue
-            with open(repo_path, "wb") as repo_file:
-                repo_file.write(response.content)
-            out.append(f"Updated repo '{repo['repo-info']['name']}' from {repo_url}.")
+            repos.append((filename, repo_path, json.load(f)))
+    if not repos:
+        return []
+
+    from concurrent.futures import ThreadPoolExecutor
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=UPDATE_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(min(UPDATE_WORKERS, len(repos))) as executor:
+            results = list(executor.map(lambda item: _update_repo(api, session, *item), repos))
+
+    out = [message for message, _ in results]
+    if any(changed for _, changed in results):
+        out.append(build(api, []))
     return out
+def _update_repo(api, session, filename, repo_path, repo):
+    '''
+    Fetch one repository. Returns (status message, whether the repo file changed).
+    '''
+    info = repo.get("repo-info", {})
+    name = info.get("name", filename[:-len(".json")])
+    repo_url = info.get("url")
+    if not repo_url:
+        return f"Repo '{name}' has no update URL.", False
+    try:
+        cached_path, _ = api["download"](repo_url, None, session)
+    except OSError as e:
+        return f"Failed to update repo from {repo_url}: {e}", False
+    with open(cached_path, "rb") as f:
+        data = f.read()
+    with open(repo_path, "rb") as f:
+        if f.read() == data:
+            return f"Repo '{name}' is up to date.", False
+    api["atomic_write"](repo_path, data)
+    return f"Updated repo '{name}' from {repo_url}.", True
 def search(api, args):
     '''
-    Search for plugins in configured repositories. Returns list of matches.
+    Search for plugins in configured repositories. Returns list of matches, best first.
+    Usage: search [--limit N] <terms>
+    Queries the index written by build, rebuilding it first if the repositories changed.
+    Terms match anywhere in a plugin name, or at the start of a word in its description.
     '''
-    out = []
+    limit = SEARCH_LIMIT
+    if len(args) >= 2 and args[0] == "--limit":
+        if not args[1].isdigit():
+            return "The search limit must be a number."
+        limit = int(args[1])
+        args = args[2:]
+    queries = [arg.lower() for arg in args if arg.strip()]
+    if not queries:
+        return "Usage: repo search [--limit N] <terms>"
+
+    conn = _open_search_index(api)
+    scores = {}
+    docs = {}
+    try:
+        for query in queries:
+            for doc, name, description in _search_candidates(conn, query):
+                score = _score(query, name.lower(), description.lower())
+                if score:
+                    scores[doc] = scores.get(doc, 0) + score
+                    docs[doc] = (name, description)
+    finally:
+        conn.close()
+    ranked = sorted(scores, key=lambda doc: (-scores[doc], docs[doc][0]))[:limit]
+    return [f"{docs[doc][0]}: {docs[doc][1] or 'No description.'}" for doc in ranked]
+def _open_search_index(api):
+    '''
+    Open the search index read-only, building it first if it is missing or stale.
+    '''
+    import sqlite3
     config_dir = api["get_config_dir"]()
-    config_dir_self = _get_config_dir_self(config_dir)
-    for filename in os.listdir(config_dir_self):
-        if not filename.endswith(".json"):
-            continue
-        repo_path = os.path.join(config_dir_self, filename)
-        with open(repo_path, "r") as f:
-            repo = json.load(f)
-            for plugin in repo.get("plugins", []):
-                if any(arg.lower() in plugin["name"].lower() or arg.lower() in plugin.get("description", "").lower() for arg in args):
-                    out.append(f"{plugin['name']}: {plugin.get('description', 'No description.')}")
-    return out
+    index_path = os.path.join(_get_config_dir_pkg(config_dir), SEARCH_INDEX_FILE)
+    stamps = json.dumps(_repo_stamps(_get_config_dir_self(config_dir)))
+    for attempt in range(2):
+        if os.path.exists(index_path):
+            conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("format") == str(SEARCH_INDEX_FORMAT) and meta.get("stamps") == stamps:
+                return conn
+            conn.close()
+        if attempt == 0:
+            build(api, [])
+    raise Exception("The repository search index could not be built.")
+def _search_candidates(conn, query):
+    '''
+    Find the plugins that may match one query term. Returns (id, name, description) rows.
+    '''
+    grams = sorted(_grams(query))
+    if grams:
+        placeholders = ",".join("?" * len(grams))
+        sql = f"SELECT doc FROM name_grams WHERE gram IN ({placeholders}) GROUP BY doc HAVING COUNT(*) = {len(grams)}"
+        params = grams
+    else:
+        sql = "SELECT id FROM docs WHERE instr(lower(name), ?)"
+        params = [query]
+    tokens = TOKEN_RE.findall(query)
+    if tokens:
+        # Every word of the term must start a word of the description
+        words = " INTERSECT ".join("SELECT doc FROM terms WHERE term >= ? AND term < ?" for _ in tokens)
+        sql += f" UNION SELECT doc FROM ({words})"
+        for token in tokens:
+            params += [token, token + chr(0x10FFFF)]
+    return conn.execute(f"SELECT id, name, description FROM docs WHERE id IN ({sql})", params)
+def _score(query, name, description):
+    if name == query:
+        score = 100
+    elif name.startswith(query):
+        score = 50
+    elif query in TOKEN_RE.findall(name):
+        score = 30
+    elif query in name:
+        score = 20
+    else:
+        score = 0
+    if query in description:
+        score += 5
+    return score
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 def build(api, args):
     '''
     Build the plugin index from configured repositories.
     Produces a mapping of plugin name -> metadata similar to the default index used by pkg.install.
+    Only repository files that changed since the last build are read; when several repos
+    provide the same plugin, the one whose file name sorts last wins.
     '''
+    import hashlib
     config_dir = api["get_config_dir"]()
     config_dir_pkg = _get_config_dir_pkg(config_dir)
     config_dir_self = _get_config_dir_self(config_dir)
-    index = {}
-    for filename in os.listdir(config_dir_self):
-        if not filename.endswith(".json"):
-            continue
-        repo_path = os.path.join(config_dir_self, filename)
-        with open(repo_path, "r") as f:
-            repo = json.load(f)
-            plugins = repo.get("plugins", [])
-            # Support both dict and list formats
-            if isinstance(plugins, dict):
-                for name, plugin in plugins.items():
-                    if isinstance(plugin, dict):
-                        index[name] = plugin
-                    else:
-                        index[name] = {"url": str(plugin)}
-            elif isinstance(plugins, list):
-                for plugin in plugins:
-                    if not isinstance(plugin, dict):
-                        continue
-                    name = plugin.get("name") or plugin.get("id") or plugin.get("url", "").split("/")[-1].replace(".py", "")
-                    index[name] = plugin
     index_path = os.path.join(config_dir_pkg, "index.json")
-    with open(index_path, "w") as f:
-        json.dump(index, f, indent=4)
+    state_path = os.path.join(config_dir_pkg, BUILD_STATE_FILE)
+    # Taken before reading so a repo changed meanwhile is picked up by the next build
+    stamps = _repo_stamps(config_dir_self)
+
+    state = _read_json(state_path)
+    index = _read_json(index_path)
+    if state.get("format") != BUILD_STATE_FORMAT or not isinstance(index, dict) or not os.path.exists(index_path):
+        state = {}
+        index = {}
+    sources = state.get("repos", {})
+    entries = {}
+    affected = set()
+    for filename in set(sources) - set(stamps):
+        affected.update(sources.pop(filename)["names"])
+    for filename, stamp in stamps.items():
+        source = sources.get(filename)
+        if source and source["stamp"] == stamp:
+            continue
+        with open(os.path.join(config_dir_self, filename), "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if source and source["sha256"] == digest:
+            source["stamp"] = stamp
+            continue
+        entries[filename] = _repo_entries(json.loads(data))
+        if source:
+            affected.update(source["names"])
+        affected.update(entries[filename])
+        sources[filename] = {"stamp": stamp, "sha256": digest, "names": sorted(entries[filename])}
+
+    owners = {}
+    for filename in sorted(sources):
+        for name in sources[filename]["names"]:
+            if name in affected:
+                owners[name] = filename
+    changed = set()
+    for name in affected:
+        filename = owners.get(name)
+        if filename is None:
+            if index.pop(name, None) is not None:
+                changed.add(name)
+            continue
+        if filename not in entries:
+            # The name was shadowed by a repo that changed; take it from the next owner
+            with open(os.path.join(config_dir_self, filename), "r") as f:
+                entries[filename] = _repo_entries(json.load(f))
+        if index.get(name) != entries[filename][name]:
+            index[name] = entries[filename][name]
+            changed.add(name)
+
+    if changed or not state:
+        api["atomic_write"](index_path, json.dumps(index, separators=(",", ":")), durable=False)
+    _update_search_index(os.path.join(config_dir_pkg, SEARCH_INDEX_FILE), index, changed if state else None, stamps)
+    api["atomic_write"](
+        state_path,
+        json.dumps({"format": BUILD_STATE_FORMAT, "repos": sources}, separators=(",", ":")),
+        durable=False,
+    )
     return f"Built plugin index with {len(index)} plugins at {index_path}."
+def _repo_entries(repo):
+    '''
+    Map plugin name -> metadata for the plugins listed in one repository.
+    '''
+    entries = {}
+    plugins = repo.get("plugins", [])
+    # Support both dict and list formats
+    if isinstance(plugins, dict):
+        for name, plugin in plugins.items():
+            if isinstance(plugin, dict):
+                entries[name] = plugin
+            else:
+                entries[name] = {"url": str(plugin)}
+    elif isinstance(plugins, list):
+        for plugin in plugins:
+            if not isinstance(plugin, dict):
+                continue
+            name = plugin.get("name") or plugin.get("id") or plugin.get("url", "").split("/")[-1].replace(".py", "")
+            entries[name] = plugin
+    return entries
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+def _update_search_index(index_path, index, names, stamps):
+    '''
+    Bring the search index in line with the plugin index. Only the plugins in names are
+    re-indexed; when names is None, or the search index is missing or outdated, it is
+    built from scratch aside and renamed into place.
+    '''
+    import sqlite3
+    if names is not None and os.path.exists(index_path):
+        conn = sqlite3.connect(index_path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("format") == str(SEARCH_INDEX_FORMAT):
+                with conn:
+                    for name in names:
+                        row = conn.execute("SELECT id FROM docs WHERE name = ?", (name,)).fetchone()
+                        if row:
+                            conn.execute("DELETE FROM docs WHERE id = ?", row)
+                            conn.execute("DELETE FROM name_grams WHERE doc = ?", row)
+                            conn.execute("DELETE FROM terms WHERE doc = ?", row)
+                    _insert_search_docs(conn, ((name, index[name]) for name in names if name in index))
+                    conn.execute("UPDATE meta SET value = ? WHERE key = 'stamps'", (json.dumps(stamps),))
+                return
+        except sqlite3.DatabaseError:
+            pass
+        finally:
+            conn.close()
+
+    import tempfile
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), prefix=".hub-tmp-")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(temp_path)
+        with conn:
+            conn.executescript("""
+                CREATE TABLE docs (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, description TEXT NOT NULL);
+                CREATE TABLE name_grams (gram TEXT NOT NULL, doc INTEGER NOT NULL, PRIMARY KEY (gram, doc)) WITHOUT ROWID;
+                CREATE TABLE terms (term TEXT NOT NULL, doc INTEGER NOT NULL, PRIMARY KEY (term, doc)) WITHOUT ROWID;
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """)
+            _insert_search_docs(conn, sorted(index.items()))
+            # Created after the bulk insert, which is faster than maintaining them row by row
+            conn.execute("CREATE INDEX name_grams_doc ON name_grams (doc)")
+            conn.execute("CREATE INDEX terms_doc ON terms (doc)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format", str(SEARCH_INDEX_FORMAT)),
+                ("stamps", json.dumps(stamps)),
+            ])
+        conn.close()
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+def _insert_search_docs(conn, plugins):
+    '''
+    Index plugins: every plugin with trigrams of its name and the words of its name and description.
+    '''
+    docs = []
+    grams = []
+    terms = []
+    doc = conn.execute("SELECT COALESCE(MAX(id), 0) FROM docs").fetchone()[0]
+    for name, plugin in plugins:
+        doc += 1
+        description = str(plugin.get("description", "")) if isinstance(plugin, dict) else ""
+        docs.append((doc, name, description))
+        grams.extend((gram, doc) for gram in _grams(name.lower()))
+        terms.extend((term, doc) for term in set(TOKEN_RE.findall(f"{name} {description}".lower())))
+    conn.executemany("INSERT INTO docs VALUES (?, ?, ?)", docs)
+    conn.executemany("INSERT INTO name_grams VALUES (?, ?)", grams)
+    conn.executemany("INSERT INTO terms VALUES (?, ?)", terms)
+def _repo_stamps(config_dir_self):
+    stamps = {}
+    for entry in sorted(os.scandir(config_dir_self), key=lambda entry: entry.name):
+        if entry.name.endswith(".json") and entry.is_file():
+            stat = entry.stat()
+            stamps[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
 def _get_config_dir_pkg(config_dir):
     pkg_config_dir = os.path.join(config_dir, "pkg")
     if not os.path.exists(pkg_config_dir):
@@ -0,0 +1,144 @@
+'''
+File: profiling.py
+Description: Phase-level profiling of hub invocations, enabled with `hub --profile` or
+HUB_PROFILE (see main.py)
+
+Each phase records its wall time and the change in the number of memory blocks the
+interpreter has allocated (sys.getallocatedblocks()). Phases nest, and are reported as an
+indented table on stderr or appended as JSON lines to a file.
+'''
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Number of functions shown when cProfile statistics are printed rather than saved
+CPROFILE_LINES = 25
+
+
+class Profiler:
+    '''
+    Collects the phases of one hub command
+
+    Args:
+        output: Path of a JSON lines file to append to, or None to print a table to stderr
+        cprofile: Wrap plugin commands in cProfile: a path to save the statistics to,
+            "-" to print them to stderr, or None to not run cProfile
+        phases: Whether to report phases at all, rather than only cProfile statistics
+    '''
+
+    def __init__(self, output=None, cprofile=None, phases=True):
+        self.output = output
+        self.cprofile = cprofile
+        self.phases = phases
+        self.records = []
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''
+        Time a phase of the command
+
+        Args:
+            name: Name shown in the report
+        '''
+        record = {"phase": name, "depth": self._depth}
+        self.records.append(record)
+        self._depth += 1
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["wall_ms"] = (time.perf_counter() - start) * 1000
+            record["blocks"] = sys.getallocatedblocks() - blocks
+            self._depth -= 1
+
+    def call(self, func, *args):
+        '''
+        Call a function, under cProfile if that was asked for
+
+        Args:
+            func: The function to call
+            args: Its arguments
+
+        Returns:
+            The function's return value
+        '''
+        if not self.cprofile:
+            return func(*args)
+        import cProfile  # pylint: disable=import-outside-toplevel
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            if self.cprofile == "-":
+                import pstats  # pylint: disable=import-outside-toplevel
+                stats = pstats.Stats(profile, stream=sys.stderr)
+                stats.sort_stats("cumulative").print_stats(CPROFILE_LINES)
+            else:
+                profile.dump_stats(self.cprofile)
+
+    def report(self, args):
+        '''
+        Report the phases recorded since the last report, then forget them
+
+        Args:
+            args: The command line that was profiled
+        '''
+        records, self.records = self.records, []
+        if not records or not self.phases:
+            return
+        if self.output:
+            now = time.time()
+            with open(self.output, "a", encoding="UTF-8") as file:
+                for record in records:
+                    file.write(json.dumps(dict(record, time=now, pid=os.getpid(), argv=list(args))) + "\n")
+            return
+
+        width = max(len(record["phase"]) + 2 * record["depth"] for record in records)
+        width = max(width, len("phase"))
+        print(f"profile: {' '.join(args)}", file=sys.stderr)
+        print(f"  {'phase':<{width}}  {'wall ms':>9}  {'blocks':>9}", file=sys.stderr)
+        for record in records:
+            name = "  " * record["depth"] + record["phase"]
+            wall = record.get("wall_ms", 0.0)
+            blocks = record.get("blocks", 0)
+            print(f"  {name:<{width}}  {wall:>9.2f}  {blocks:>+9d}", file=sys.stderr)
+
+
+def parse_options(args, environ=None):
+    '''
+    Take the profiling options off the front of a hub command line
+
+    --profile prints a table of phases to stderr and --profile=FILE appends them to FILE
+    as JSON lines; --cprofile prints cProfile statistics for the plugin command to stderr
+    and --cprofile=FILE saves them to FILE. HUB_PROFILE and HUB_CPROFILE do the same
+    ("1" meaning stderr) when the options are not given.
+
+    Args:
+        args: The command line, without the program name
+        environ: Environment to read, os.environ by default
+
+    Returns:
+        Tuple of (a Profiler, or None if profiling is off, the remaining arguments)
+    '''
+    environ = os.environ if environ is None else environ
+    profile = environ.get("HUB_PROFILE") or None
+    cprofile = environ.get("HUB_CPROFILE") or None
+    args = list(args)
+    while args and args[0].split("=", 1)[0] in ("--profile", "--cprofile"):
+        option, _, value = args.pop(0).partition("=")
+        if option == "--profile":
+            profile = value or "1"
+        else:
+            cprofile = value or "1"
+    if profile in ("0", None) and cprofile in ("0", None):
+        return None, args
+    output = None if profile in ("0", "1", None) else profile
+    if cprofile in ("0", None):
+        cprofile = None
+    elif cprofile == "1":
+        cprofile = "-"
+    return Profiler(output, cprofile, phases=profile not in ("0", None)), args
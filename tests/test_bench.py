@@ -0,0 +1,21 @@
+'''
+Smoke run of the benchmark suite (hub/bench.py)
+'''
+from hub import bench
+
+
+def test_suite_smoke():
+    results = bench.run_suite(plugins=3, notes=20, note_size=64, catalog=50, runs=2, functions=5)
+    assert "dispatch warm" in results
+    assert "notes:recall" in results
+    assert "repo:search" in results
+    for summary in results.values():
+        assert len(summary["runs_ms"]) == 2
+        assert summary["min_ms"] <= summary["p50_ms"] <= summary["p99_ms"] <= summary["max_ms"]
+
+
+def test_summarize_percentiles():
+    summary = bench.summarize([i / 1000 for i in range(1, 101)])
+    assert summary["p50_ms"] == 50
+    assert summary["p90_ms"] == 90
+    assert summary["p99_ms"] == 99
@@ -0,0 +1,128 @@
+'''
+Tests for the hub daemon protocol (hub/daemon.py)
+'''
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from hub import daemon
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+class _Stdin(io.TextIOWrapper):
+    '''A piped stdin holding the given bytes'''
+
+    def __init__(self, data=b""):
+        super().__init__(io.BufferedReader(io.BytesIO(data)), encoding="UTF-8")
+
+
+def _run_command(argv):
+    if argv[0] == "echo":
+        print(" ".join(argv[1:]))
+    elif argv[0] == "fail":
+        return False
+    elif argv[0] == "exit":
+        sys.exit(int(argv[1]))
+    elif argv[0] == "stdin":
+        print(repr(sys.stdin.read()))
+    elif argv[0] == "stdin-bytes":
+        print(len(sys.stdin.buffer.read()))
+    elif argv[0] == "cat":
+        print("text", flush=True)
+        sys.stdout.buffer.write(sys.stdin.buffer.read())
+    elif argv[0] == "sleep":
+        time.sleep(float(argv[1]))
+    elif argv[0] == "env":
+        print(os.environ.get(argv[1]))
+    return True
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    '''
+    Serve _run_command from a daemon in another process, as the daemon swaps the
+    process-wide stdin and stdout while a command runs
+    '''
+    path = str(tmp_path / "hub.sock")
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, tests_dir, env.get("PYTHONPATH")]))
+    script = f"from hub import daemon; from test_daemon import _run_command; daemon.serve({path!r}, _run_command)"
+    with subprocess.Popen([sys.executable, "-u", "-c", script], env=env, stdout=subprocess.PIPE) as process:
+        # The daemon announces itself once it listens, after creating the socket file
+        process.stdout.readline()
+        monkeypatch.setattr(sys, "stdin", _Stdin())
+        yield path
+        daemon.stop(path)
+        process.wait(5)
+
+
+def test_forward_streams_output(socket_path, capsys):
+    assert daemon.forward(socket_path, ["echo", "hello", "daemon"]) == 0
+    assert capsys.readouterr().out == "hello daemon\n"
+
+
+def test_forward_exit_codes(socket_path):
+    assert daemon.forward(socket_path, ["fail"]) == 1
+    assert daemon.forward(socket_path, ["exit", "3"]) == 3
+
+
+def test_forwarded_commands_read_the_client_stdin(socket_path, monkeypatch, capsys):
+    assert daemon.forward(socket_path, ["stdin"]) == 0
+    assert capsys.readouterr().out == "''\n"
+    monkeypatch.setattr(sys, "stdin", _Stdin("piped\nlines\n".encode("UTF-8")))
+    assert daemon.forward(socket_path, ["stdin"]) == 0
+    assert capsys.readouterr().out == "'piped\\nlines\\n'\n"
+    data = bytes(range(256)) * 1000
+    monkeypatch.setattr(sys, "stdin", _Stdin(data))
+    assert daemon.forward(socket_path, ["stdin-bytes"]) == 0
+    assert capsys.readouterr().out == f"{len(data)}\n"
+
+
+def test_forwarded_commands_write_bytes(socket_path, monkeypatch, capsysbinary):
+    data = bytes(range(256)) * 100
+    monkeypatch.setattr(sys, "stdin", _Stdin(data))
+    assert daemon.forward(socket_path, ["cat"]) == 0
+    assert capsysbinary.readouterr().out == b"text\n" + data
+
+
+def test_busy_daemon_runs_commands_locally(socket_path):
+    # As in `hub mem:export | hub mem:import`, where the daemon serving one waits on the other
+    busy = threading.Thread(target=daemon.forward, args=(socket_path, ["sleep", "1"]))
+    busy.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    assert daemon.forward(socket_path, ["echo", "x"]) is None
+    assert time.monotonic() - start < 0.9
+    busy.join()
+
+
+def test_unrelated_environment_is_not_compared():
+    assert "XDG_SESSION_ID" not in daemon.relevant_environment({"XDG_SESSION_ID": "99", "HOME": "/h"})
+    assert daemon.relevant_environment({"HUB_OFFLINE": "1"}) == {"HUB_OFFLINE": "1"}
+
+
+def test_different_environment_runs_locally(socket_path):
+    # Speak the protocol as a client whose environment differs from the daemon's
+    environment = dict(daemon.relevant_environment(), HUB_OFFLINE="1")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        request = {"argv": ["echo", "x"], "cwd": os.getcwd(), "env": environment}
+        sock.sendall(json.dumps(request).encode("UTF-8") + b"\n")
+        with sock.makefile("rb") as stream:
+            assert json.loads(stream.readline()) == {"ready": True}
+            assert json.loads(stream.readline()) == {"local": True}
+
+
+def test_no_daemon(tmp_path):
+    assert daemon.forward(str(tmp_path / "none.sock"), ["echo"]) is None
+    assert daemon.stop(str(tmp_path / "none.sock")) is False
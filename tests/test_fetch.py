@@ -0,0 +1,98 @@
+'''
+Tests for the shared download cache (hub/fetch.py)
+'''
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hub import fetch
+
+BODY = bytes(range(256)) * 4096
+
+
+def test_fetch_caches_by_content(tmp_path, http_server):
+    http_server.files["/a.bin"] = BODY
+    cache = fetch.DownloadCache(str(tmp_path))
+    path, digest = cache.fetch(http_server.base_url + "/a.bin")
+    assert digest == hashlib.sha256(BODY).hexdigest()
+    with open(path, "rb") as file:
+        assert file.read() == BODY
+
+    # Known hash: served from the cache without a request
+    count = len(http_server.requests)
+    assert cache.fetch(http_server.base_url + "/a.bin", sha256=digest) == (path, digest)
+    assert len(http_server.requests) == count
+
+    # Unknown hash: revalidated with a conditional request
+    assert cache.fetch(http_server.base_url + "/a.bin") == (path, digest)
+    assert "If-None-Match" in http_server.requests[-1][1]
+
+
+def test_fetch_rejects_checksum_mismatch(tmp_path, http_server):
+    http_server.files["/a.bin"] = BODY
+    cache = fetch.DownloadCache(str(tmp_path))
+    with pytest.raises(fetch.DownloadError):
+        cache.fetch(http_server.base_url + "/a.bin", sha256="0" * 64)
+
+
+def test_fetch_offline(tmp_path, http_server, monkeypatch):
+    http_server.files["/a.bin"] = BODY
+    cache = fetch.DownloadCache(str(tmp_path))
+    _, digest = cache.fetch(http_server.base_url + "/a.bin")
+    monkeypatch.setenv("HUB_OFFLINE", "1")
+    count = len(http_server.requests)
+    assert cache.fetch(http_server.base_url + "/a.bin")[1] == digest
+    assert len(http_server.requests) == count
+    with pytest.raises(fetch.DownloadError):
+        cache.fetch(http_server.base_url + "/missing.bin")
+
+
+def test_fetch_resumes_interrupted_download(tmp_path, http_server):
+    http_server.files["/a.bin"] = BODY
+    http_server.drop.add("/a.bin")
+    cache = fetch.DownloadCache(str(tmp_path))
+    with pytest.raises(fetch.DownloadError):
+        cache.fetch(http_server.base_url + "/a.bin")
+    path, digest = cache.fetch(http_server.base_url + "/a.bin")
+    assert digest == hashlib.sha256(BODY).hexdigest()
+    assert http_server.requests[-1][1].get("Range") == f"bytes={len(BODY) // 2}-"
+    with open(path, "rb") as file:
+        assert file.read() == BODY
+
+
+def test_concurrent_fetches_of_one_url(tmp_path, http_server):
+    http_server.files["/a.bin"] = BODY
+    url = http_server.base_url + "/a.bin"
+
+    def fetch_once(_):
+        # A cache object per thread, like separate hub processes sharing a cache
+        return fetch.DownloadCache(str(tmp_path)).fetch(url)[1]
+
+    with ThreadPoolExecutor(4) as executor:
+        digests = list(executor.map(fetch_once, range(4)))
+    assert digests == [hashlib.sha256(BODY).hexdigest()] * 4
+
+
+def test_evicts_least_recently_used(tmp_path, http_server):
+    cache = fetch.DownloadCache(str(tmp_path), max_size=len(BODY) + 10)
+    http_server.files["/a.bin"] = BODY
+    http_server.files["/b.bin"] = BODY[::-1]
+    first, _ = cache.fetch(http_server.base_url + "/a.bin")
+    second, _ = cache.fetch(http_server.base_url + "/b.bin")
+    assert not (tmp_path / first).exists()
+    assert (tmp_path / second).exists()
+
+
+def test_unreachable_server_is_an_error(tmp_path, http_server, monkeypatch):
+    http_server.files["/a.bin"] = BODY
+    url = http_server.base_url + "/a.bin"
+    cache = fetch.DownloadCache(str(tmp_path))
+    _, digest = cache.fetch(url)
+    http_server.shutdown()
+    http_server.server_close()
+    # The cached copy may be stale; only HUB_OFFLINE asks for it
+    with pytest.raises(fetch.DownloadError, match="HUB_OFFLINE"):
+        cache.fetch(url)
+    monkeypatch.setenv("HUB_OFFLINE", "1")
+    assert cache.fetch(url)[1] == digest
@@ -0,0 +1,22 @@
+'''
+Import-time regression tests for one-shot hub commands (hub/bench.py --imports)
+'''
+import os
+
+import pytest
+
+from hub import bench
+
+
+def test_one_shot_commands_skip_the_terminal_stack():
+    _, modules = bench.measure_imports(["hi"])
+    assert [name for name in modules if name.split(".")[0] in bench.INTERACTIVE_MODULES] == []
+
+
+@pytest.mark.skipif(
+    "HUB_IMPORT_BUDGET_MS" not in os.environ,
+    reason="wall-clock check, opt in with HUB_IMPORT_BUDGET_MS=25",
+)
+def test_one_shot_import_budget():
+    budget = float(os.environ["HUB_IMPORT_BUDGET_MS"]) / 1000
+    assert bench.check_import_budget(budget) == []
@@ -0,0 +1,99 @@
+'''
+Tests for indexing plugins from their source without importing them (hub/main.py)
+'''
+import os
+
+import pytest
+
+from hub import main
+
+PLUGINS_DIR = os.path.join(os.path.dirname(main.__file__), "plugins")
+BUNDLED = sorted(name for name in os.listdir(PLUGINS_DIR) if name.endswith(".py") and name != "__init__.py")
+
+PLUGIN = '''
+"""A plugin."""
+import re
+
+VMAJOR = 1
+VMINOR = 2
+VPATCH = 3
+ID = "com.example.test"
+PARALLEL = {"show": "thread", "add": "process", "missing": "thread"}
+CHUNK_SIZE = 64 * 1024
+_WORD = re.compile(r"\\w+")
+
+
+def meta_data():
+    return {"name": "test", "file_path": __file__}
+
+
+def show(api, args):
+    return args
+
+
+def add(api, args):
+    return args
+
+
+def import_(api, args):
+    return args
+
+
+def hub_add_api():
+    return {"show": show}
+'''
+
+
+def describe(source):
+    return main._describe_plugin_source(source.encode("utf-8"), "/plugins/test.py")
+
+
+@pytest.mark.parametrize("filename", BUNDLED)
+def test_source_matches_the_imported_module(hub_dirs, filename):
+    path = os.path.join(PLUGINS_DIR, filename)
+    with open(path, "rb") as file:
+        source = main._describe_plugin_source(file.read(), path)
+    assert source is not None
+    assert source == main._describe_plugin_module(main.load_plugin_module(filename[:-3], path))
+
+
+def test_describes_the_common_layout():
+    assert describe(PLUGIN) == {
+        "id": "com.example.test",
+        "version": [1, 2, 3],
+        "commands": ["add", "import", "show"],
+        "meta": {"name": "test", "file_path": "/plugins/test.py"},
+        "api": ["show"],
+        "parallel": {"show": "thread", "add": "process"},
+    }
+
+
+@pytest.mark.parametrize("change", [
+    # A decorator may replace or register the function
+    ("def show(api, args):", "@staticmethod\ndef show(api, args):"),
+    # An alias adds a command bound to another function
+    ("def add(api, args):", "remove = show\n\n\ndef add(api, args):"),
+    # Public names bound to anything but a literal may be commands
+    ("def add(api, args):", "remove = lambda api, args: args\n\n\ndef add(api, args):"),
+    ("def add(api, args):", "remove = re.sub\n\n\ndef add(api, args):"),
+    # Module-level code other than assignments and definitions
+    ("def add(api, args):", "if ID:\n    def remove(api, args):\n        return args\n\n\ndef add(api, args):"),
+    # Values only known at runtime
+    ('PARALLEL = {"show": "thread", "add": "process", "missing": "thread"}', 'PARALLEL = dict(show="thread")'),
+    ('ID = "com.example.test"', 'ID = "com.example." + __name__'),
+    ("VMAJOR = 1", "VMAJOR = int(re.__version__[0])"),
+    ("CHUNK_SIZE = 64 * 1024", "CHUNK_SIZE = 64 * VMAJOR ** 1024"),
+    ("CHUNK_SIZE = 64 * 1024", 'CHUNK_SIZE = "64" * 1024'),
+    # meta_data() and hub_add_api() must return dict literals
+    ('    return {"name": "test", "file_path": __file__}', '    return dict(name="test")'),
+    ('    return {"show": show}', '    table = {"show": show}\n    return table'),
+    ('    return {"show": show}', '    return {show.__name__: show}'),
+])
+def test_gives_up_on_code_it_cannot_read(change):
+    old, new = change
+    assert old in PLUGIN
+    assert describe(PLUGIN.replace(old, new)) is None
+
+
+def test_gives_up_on_syntax_errors():
+    assert describe(PLUGIN + "\ndef broken(:\n") is None
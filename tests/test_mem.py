@@ -0,0 +1,165 @@
+'''
+End-to-end tests of the notes plugin (hub/plugins/mem.py) through the hub command line
+'''
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def hub(*args, stdin=None):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-m", "hub.main", *args],
+        env=env,
+        input=stdin,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return result.stdout
+
+
+def test_search_index_stays_out_of_the_data_dir(hub_dirs):
+    hub("mem:new", "alpha", "hello", "world")
+    hub("mem:new", "beta", "goodbye", "world")
+    assert hub("mem:search", "world").split() == ["alpha", "beta"]
+    assert hub("mem:search", "hello").split() == ["alpha"]
+    data_dir = hub_dirs / "data" / "hub"
+    assert sorted(os.listdir(data_dir)) == ["alpha", "beta"]
+    hub("mem:delete", "alpha")
+    assert hub("mem:search", "hello").strip() == "No notes match 'hello'."
+
+
+def test_search_sees_notes_changed_outside_hub(hub_dirs):
+    hub("mem:new", "alpha", "hello")
+    data_dir = hub_dirs / "data" / "hub"
+    (data_dir / "external").write_text("written outside")
+    assert hub("mem:search", "outside").split() == ["external"]
+    # Edited in place: found once the periodic rescan or a reindex runs
+    with open(data_dir / "alpha", "a") as file:
+        file.write(" freshterm")
+    hub("mem:reindex")
+    assert hub("mem:search", "freshterm").split() == ["alpha"]
+
+
+def test_export_import_round_trip(hub_dirs, tmp_path, monkeypatch):
+    hub("mem:new", "alpha", "hello")
+    hub("mem:new", "beta", "world")
+    archive = str(tmp_path / "notes.tar.gz")
+    assert hub("mem:export", "--output", archive).strip() == f"Exported 2 note(s) to '{archive}'."
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "other"))
+    assert hub("mem:import", archive).strip() == "Imported 2 note(s)."
+    assert hub("mem:recall", "beta").strip() == "world"
+
+
+def test_import_jsonl_from_stdin_skips_bad_names(hub_dirs):
+    lines = [
+        '{"name": "good", "body": "fine"}',
+        '{"name": "../escape", "body": "bad"}',
+        "not json",
+    ]
+    output = hub("mem:import", stdin="\n".join(lines) + "\n")
+    assert output.strip() == "Imported 1 note(s). Skipped 2 existing or invalid note(s)."
+    records = [json.loads(line) for line in hub("mem:export").splitlines()]
+    assert [(record["name"], record["body"]) for record in records] == [("good", "fine")]
+
+
+def test_parallel_batch_keeps_dependent_commands_in_order(hub_dirs):
+    lines = []
+    for i in range(40):
+        lines += [f"mem:new k{i} v{i}", f"mem:recall k{i}"]
+    lines += [f"mem:new same v{i}" for i in range(20)]
+    lines.append("mem:recall same")
+    output = hub("run", "--jobs", "8", "-", stdin="\n".join(lines) + "\n")
+    assert "does not exist" not in output
+    assert output.splitlines()[-1] == "v19"
+
+
+def test_parallel_commands_reach_other_plugins_apis(hub_dirs):
+    hub("mem:new", "shared", "from", "mem")
+    plugin = hub_dirs / "config" / "hub" / "plugins" / "peek.py"
+    plugin.write_text(
+        'ID = "peek"\n'
+        'PARALLEL = {"show": "thread"}\n'
+        "\n\n"
+        "def show(api, args):\n"
+        '    return api["com.flench04.mem"]["recall note"](api, args)\n'
+    )
+    output = hub("run", "--jobs", "2", "-", stdin="peek:show shared\npeek:show shared\n")
+    assert output.splitlines() == ["from mem", "from mem"]
+
+
+def test_sqlite_backend(hub_dirs):
+    hub("mem:new", "alpha", "hello", "world")
+    assert hub("mem:migrate", "sqlite").strip() == "Migrated 1 note(s) to the sqlite backend."
+    data_dir = hub_dirs / "data" / "hub"
+    assert not (data_dir / "alpha").exists()
+    hub("mem:new", "beta", "goodbye")
+    hub("mem:append", "beta", "world")
+    assert hub("mem:recall", "beta") == "goodbye\nworld\n"
+    assert hub("mem:list").split() == ["alpha", "beta"]
+    assert hub("mem:search", "world").split() == ["alpha", "beta"]
+    hub("mem:delete", "alpha")
+    assert hub("mem:search", "hello").strip() == "No notes match 'hello'."
+
+
+def test_note_names_must_be_file_names(hub_dirs):
+    hub("mem:new", "alpha", "hello")
+    hub("mem:migrate", "sqlite")
+    # Refused with either backend, so `migrate files` can always move every note
+    for command in ("new", "edit", "append"):
+        for name in ("c/d", "..", ".hub-notes.json"):
+            assert hub(f"mem:{command}", name, "body").strip() == f"'{name}' cannot be used as a note name."
+    assert hub("mem:list").split() == ["alpha"]
+
+
+def test_migrate_reports_names_it_cannot_move(hub_dirs):
+    hub("mem:new", "alpha", "hello")
+    hub("mem:migrate", "sqlite")
+    # A note stored before names were checked
+    data_dir = hub_dirs / "data" / "hub"
+    with sqlite3.connect(data_dir / ".hub-notes.db") as conn:
+        conn.execute("INSERT INTO notes VALUES ('c/d', CAST('legacy' AS BLOB), 0)")
+    output = hub("mem:migrate", "files")
+    assert output.startswith("Cannot migrate: 1 note name(s) cannot be stored as files: 'c/d'.")
+    assert hub("mem:recall", "alpha").strip() == "hello"
+    assert hub("mem:recall", "c/d").strip() == "legacy"
+    hub("mem:delete", "c/d")
+    assert hub("mem:migrate", "files").strip() == "Migrated 1 note(s) to the files backend."
+    assert sorted(os.listdir(data_dir)) == [".hub-notes.json", "alpha"]
+    assert hub("mem:recall", "alpha").strip() == "hello"
+
+
+def test_compressed_notes_recall_and_append(hub_dirs):
+    body = " ".join(f"word{i}" for i in range(2000))
+    hub("mem:compress", "zlib", "--threshold", "100")
+    hub("mem:new", "large", body)
+    with open(hub_dirs / "data" / "hub" / "large", "rb") as file:
+        assert file.read(5) == b"\x00hubz"
+    assert hub("mem:recall", "large").strip() == body
+    hub("mem:append", "large", "tail")
+    assert hub("mem:recall", "large").strip() == body + "\ntail"
+
+
+def test_compress_rewrites_existing_notes(hub_dirs):
+    body = " ".join(f"word{i}" for i in range(2000))
+    data_dir = hub_dirs / "data" / "hub"
+    for backend in ("files", "sqlite"):
+        hub("mem:migrate", backend)
+        hub("mem:new", "large", body)
+        hub("mem:new", "small", "tiny")
+        assert hub("mem:compress", "lzma", "--threshold", "100").strip().endswith("1 note(s) rewritten.")
+        if backend == "files":
+            assert (data_dir / "large").read_bytes()[:5] == b"\x00hubx"
+        assert hub("mem:recall", "large").strip() == body
+        # The index keeps the terms of rewritten notes
+        assert hub("mem:search", "word1999").split() == ["large"]
+        assert hub("mem:compress", "off").strip() == "Compression disabled; 1 note(s) decompressed."
+        if backend == "files":
+            assert (data_dir / "large").read_text() == body
+        assert hub("mem:recall", "large").strip() == body